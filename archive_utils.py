@@ -0,0 +1,340 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Awaitable, Callable, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "gcs" archives to a Cloud Storage bucket, "local" to a directory (tests and
+# local development), "none" disables archival.
+ARCHIVE_BACKEND = os.getenv("ARCHIVE_BACKEND", "gcs")
+ARCHIVE_BUCKET = os.getenv("ARCHIVE_BUCKET", "mockai-resume")
+ARCHIVE_LOCAL_DIR = os.getenv("ARCHIVE_LOCAL_DIR", os.path.join("tmp_files", "archive"))
+ARCHIVE_PREFIX = "answer-audio/"
+
+# Recordings wait in memory until uploaded, so the queue is bounded by their
+# total size rather than their number.
+ARCHIVE_QUEUE_MAX_BYTES = int(
+    os.getenv("ARCHIVE_QUEUE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", "2"))
+ARCHIVE_MAX_ATTEMPTS = int(os.getenv("ARCHIVE_MAX_ATTEMPTS", "5"))
+ARCHIVE_RETRY_BASE_SECONDS = 1.0
+ARCHIVE_DRAIN_SECONDS = 10.0
+
+# Lifecycle: recordings are read rarely after the interview is reviewed, so
+# they move to cheaper storage classes as they age and are deleted after the
+# retention period (0 keeps them forever).
+ARCHIVE_NEARLINE_AFTER_DAYS = int(os.getenv("ARCHIVE_NEARLINE_AFTER_DAYS", "30"))
+ARCHIVE_COLDLINE_AFTER_DAYS = int(os.getenv("ARCHIVE_COLDLINE_AFTER_DAYS", "90"))
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "365"))
+
+STORAGE_CLASS_STANDARD = "STANDARD"
+STORAGE_CLASS_NEARLINE = "NEARLINE"
+STORAGE_CLASS_COLDLINE = "COLDLINE"
+
+
+@dataclass
+class LifecycleTier:
+    storage_class: str
+    after_days: int
+
+
+def lifecycle_tiers() -> List[LifecycleTier]:
+    return [
+        LifecycleTier(STORAGE_CLASS_NEARLINE, ARCHIVE_NEARLINE_AFTER_DAYS),
+        LifecycleTier(STORAGE_CLASS_COLDLINE, ARCHIVE_COLDLINE_AFTER_DAYS),
+    ]
+
+
+def answer_audio_key(interview_id: str, question_id: str, audio_bytes: bytes) -> str:
+    """Content-addressed object key for one answer recording."""
+    audio_hash = hashlib.sha256(audio_bytes).hexdigest()
+    return f"{ARCHIVE_PREFIX}{interview_id}/{question_id}/{audio_hash}"
+
+
+class ArchiveBackend(ABC):
+    """Base class for answer-audio storage. Methods are blocking."""
+
+    name = "base"
+
+    @abstractmethod
+    def put(self, key: str, data: bytes, content_type: str):
+        """Store ``data`` under ``key``, overwriting any existing object."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the object stored under ``key``, or None if there is none."""
+
+    def apply_lifecycle(self):
+        pass
+
+
+class GCSArchiveBackend(ArchiveBackend):
+    name = "gcs"
+
+    def __init__(self, bucket_name: str = ARCHIVE_BUCKET):
+        from google.cloud import storage
+
+        self.bucket = storage.Client().bucket(bucket_name)
+
+    def put(self, key: str, data: bytes, content_type: str):
+        from google.api_core.exceptions import PreconditionFailed
+
+        blob = self.bucket.blob(key)
+        blob.storage_class = STORAGE_CLASS_STANDARD
+        try:
+            blob.upload_from_string(
+                data, content_type=content_type, if_generation_match=0
+            )
+        except PreconditionFailed:
+            # The key is content-addressed, so the existing object is identical.
+            pass
+
+    def get(self, key: str) -> Optional[bytes]:
+        blob = self.bucket.blob(key)
+        if not blob.exists():
+            return None
+        return blob.download_as_bytes()
+
+    def apply_lifecycle(self):
+        """Install the tiering rules on the bucket, scoped to archived audio."""
+        self.bucket.reload()
+        rules = [
+            rule
+            for rule in self.bucket.lifecycle_rules
+            if ARCHIVE_PREFIX not in rule.get("condition", {}).get("matchesPrefix", [])
+        ]
+        self.bucket.lifecycle_rules = rules
+        for tier in lifecycle_tiers():
+            self.bucket.add_lifecycle_set_storage_class_rule(
+                tier.storage_class,
+                age=tier.after_days,
+                matches_prefix=[ARCHIVE_PREFIX],
+            )
+        if ARCHIVE_RETENTION_DAYS:
+            self.bucket.add_lifecycle_delete_rule(
+                age=ARCHIVE_RETENTION_DAYS, matches_prefix=[ARCHIVE_PREFIX]
+            )
+        self.bucket.patch()
+
+
+class LocalArchiveBackend(ArchiveBackend):
+    """Stores objects under ``<root>/<storage class>/<key>``.
+
+    ``apply_lifecycle`` moves files between the storage class directories by
+    age, mirroring the bucket rules, so tiering can be exercised offline.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str = ARCHIVE_LOCAL_DIR):
+        self.root = root
+
+    def _path(self, storage_class: str, key: str) -> str:
+        return os.path.join(self.root, storage_class, key)
+
+    def _find(self, key: str) -> Optional[str]:
+        for storage_class in (
+            STORAGE_CLASS_STANDARD,
+            STORAGE_CLASS_NEARLINE,
+            STORAGE_CLASS_COLDLINE,
+        ):
+            path = self._path(storage_class, key)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def put(self, key: str, data: bytes, content_type: str):
+        if self._find(key):
+            return
+        path = self._path(STORAGE_CLASS_STANDARD, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._find(key)
+        if not path:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def apply_lifecycle(self):
+        now = time.time()
+        for storage_class in (STORAGE_CLASS_STANDARD, STORAGE_CLASS_NEARLINE):
+            class_root = os.path.join(self.root, storage_class)
+            for dirpath, _, filenames in os.walk(class_root):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    key = os.path.relpath(path, class_root)
+                    age_days = (now - os.path.getmtime(path)) / 86400
+                    if ARCHIVE_RETENTION_DAYS and age_days >= ARCHIVE_RETENTION_DAYS:
+                        os.remove(path)
+                        continue
+                    target = storage_class
+                    for tier in lifecycle_tiers():
+                        if age_days >= tier.after_days:
+                            target = tier.storage_class
+                    if target != storage_class:
+                        destination = self._path(target, key)
+                        os.makedirs(os.path.dirname(destination), exist_ok=True)
+                        shutil.move(path, destination)
+
+
+ARCHIVE_BACKENDS = {
+    GCSArchiveBackend.name: GCSArchiveBackend,
+    LocalArchiveBackend.name: LocalArchiveBackend,
+}
+
+
+class AnswerArchiver:
+    """Background uploader for answer recordings.
+
+    ``submit`` only puts the recording on an in-memory queue and never waits
+    on storage; a few worker tasks upload from it, retrying with exponential
+    backoff. When the recordings queued or uploading would exceed
+    ``max_queued_bytes`` the new one is dropped and logged rather than
+    slowing the request down.
+    """
+
+    def __init__(
+        self,
+        backend: ArchiveBackend,
+        max_queued_bytes: int = ARCHIVE_QUEUE_MAX_BYTES,
+        workers: int = ARCHIVE_WORKERS,
+        max_attempts: int = ARCHIVE_MAX_ATTEMPTS,
+    ):
+        self.backend = backend
+        self.max_queued_bytes = max_queued_bytes
+        self.queued_bytes = 0
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self._queue = None
+        self._tasks = []
+        self.uploaded = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.ensure_future(self._worker()) for _ in range(self.workers)
+        ]
+
+    async def stop(self, timeout: float = ARCHIVE_DRAIN_SECONDS):
+        """Give queued uploads ``timeout`` seconds to finish, then cancel."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(
+                f"Archive shutdown with {self._queue.qsize()} recordings not uploaded"
+            )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def apply_lifecycle(self):
+        try:
+            await asyncio.to_thread(self.backend.apply_lifecycle)
+        except Exception as e:
+            logging.warning(f"Could not apply archive lifecycle rules: {e}")
+
+    def submit(
+        self,
+        key: str,
+        data: bytes,
+        content_type: str = None,
+        on_failure: Optional[Callable[[], Awaitable]] = None,
+    ) -> bool:
+        """Queue ``data`` for upload under ``key``; False if it was dropped.
+
+        ``on_failure`` is awaited if the upload still fails after every retry.
+        """
+        self.start()
+        if self.queued_bytes + len(data) > self.max_queued_bytes:
+            self.dropped += 1
+            logging.warning(
+                f"Archive queue full ({self.queued_bytes} bytes), dropping {key}"
+            )
+            return False
+        self.queued_bytes += len(data)
+        self._queue.put_nowait(
+            (key, data, content_type or "application/octet-stream", on_failure)
+        )
+        return True
+
+    async def _upload(self, key: str, data: bytes, content_type: str, on_failure):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await asyncio.to_thread(self.backend.put, key, data, content_type)
+                self.uploaded += 1
+                return
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    self.failed += 1
+                    logging.error(
+                        f"Archiving {key} failed after {attempt} attempts: {e}"
+                    )
+                    if on_failure is not None:
+                        try:
+                            await on_failure()
+                        except Exception as e:
+                            logging.error(f"Failure handler for {key} failed: {e}")
+                    return
+                delay = ARCHIVE_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+                logging.warning(f"Archiving {key} failed ({e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+
+    async def _worker(self):
+        while True:
+            key, data, content_type, on_failure = await self._queue.get()
+            try:
+                await self._upload(key, data, content_type, on_failure)
+            finally:
+                self.queued_bytes -= len(data)
+                self._queue.task_done()
+
+
+class _DisabledArchiver:
+    def start(self):
+        pass
+
+    async def apply_lifecycle(self):
+        pass
+
+    async def stop(self, timeout: float = ARCHIVE_DRAIN_SECONDS):
+        pass
+
+    def submit(
+        self, key: str, data: bytes, content_type: str = None, on_failure=None
+    ) -> bool:
+        return False
+
+
+@lru_cache(maxsize=None)
+def get_archiver(backend: str = None):
+    backend = (backend or ARCHIVE_BACKEND).lower()
+    if backend == "none":
+        return _DisabledArchiver()
+    if backend not in ARCHIVE_BACKENDS:
+        raise ValueError(
+            f"Unknown ARCHIVE_BACKEND '{backend}'. "
+            f"Expected one of: none, {', '.join(ARCHIVE_BACKENDS)}"
+        )
+    return AnswerArchiver(ARCHIVE_BACKENDS[backend]())
@@ -0,0 +1,349 @@
+import asyncio
+import io
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import httpx
+import numpy as np
+from fastapi import HTTPException
+from dotenv import load_dotenv
+
+import audio_utils
+
+load_dotenv()
+
+TRANSCRIBER_BACKEND = os.getenv("TRANSCRIBER_BACKEND", "openai")
+
+OPENAI_TRANSCRIPTION_URL = "https://api.openai.com/v1/audio/transcriptions"
+OPENAI_WHISPER_MODEL = os.getenv("OPENAI_WHISPER_MODEL", "whisper-1")
+
+# Local backend: a CTranslate2 Whisper model quantized to int8 for CPU inference.
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "small")
+LOCAL_WHISPER_COMPUTE_TYPE = os.getenv("LOCAL_WHISPER_COMPUTE_TYPE", "int8")
+LOCAL_WHISPER_WORKERS = int(os.getenv("LOCAL_WHISPER_WORKERS", "2"))
+LOCAL_WHISPER_CPU_THREADS = int(os.getenv("LOCAL_WHISPER_CPU_THREADS", "2"))
+LOCAL_WHISPER_MODEL_DIR = os.getenv("LOCAL_WHISPER_MODEL_DIR")
+
+# Streaming: how much new audio triggers a partial transcript, and how long a
+# pause must be before the text before it is considered final.
+STREAM_PARTIAL_INTERVAL_SECONDS = float(os.getenv("STREAM_PARTIAL_INTERVAL_SECONDS", "2.5"))
+STREAM_COMMIT_PAUSE_SECONDS = 0.5
+# Longest answer a stream may carry; longer ones are closed with code 1009.
+STREAM_MAX_SECONDS = float(os.getenv("STREAM_MAX_SECONDS", "600"))
+STUB_SECONDS_PER_WORD = 0.4
+
+
+class Transcriber(ABC):
+    """Base class for speech-to-text backends."""
+
+    name = "base"
+
+    async def warmup(self):
+        pass
+
+    @abstractmethod
+    async def transcribe(
+        self,
+        audio_bytes: bytes,
+        filename: str = "recording.wav",
+        content_type: str = "audio/wav",
+    ) -> str:
+        """Return the transcript of an encoded audio file."""
+
+    async def transcribe_pcm(
+        self, samples: np.ndarray, sample_rate: int = audio_utils.ASR_SAMPLE_RATE
+    ) -> str:
+        data = await audio_utils.encode_opus(samples, sample_rate)
+        return await self.transcribe(
+            data, filename="recording.ogg", content_type="audio/ogg"
+        )
+
+
+class OpenAIWhisperTranscriber(Transcriber):
+    """Hosted Whisper over the OpenAI audio transcription API."""
+
+    name = "openai"
+
+    def __init__(self, api_key: str = None, model: str = OPENAI_WHISPER_MODEL):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.model = model
+        self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Shared client so bursts of uploads reuse pooled keep-alive connections.
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=30.0)
+        return self._client
+
+    async def transcribe(
+        self,
+        audio_bytes: bytes,
+        filename: str = "recording.wav",
+        content_type: str = "audio/wav",
+    ) -> str:
+        try:
+            headers = {"Authorization": f"Bearer {self.api_key}"}
+            data = {"model": self.model}
+            files = {"file": (filename, io.BytesIO(audio_bytes), content_type)}
+
+            response = await self._get_client().post(
+                OPENAI_TRANSCRIPTION_URL, headers=headers, data=data, files=files
+            )
+
+            if response.status_code != 200:
+                raise HTTPException(
+                    status_code=response.status_code,
+                    detail=f"OpenAI API error: {response.text}",
+                )
+
+            response_json = response.json()
+        except HTTPException:
+            raise
+        except httpx.TimeoutException:
+            raise HTTPException(status_code=504, detail="OpenAI API request timed out")
+        except httpx.RequestError as e:
+            raise HTTPException(
+                status_code=502, detail=f"OpenAI API request failed: {str(e)}"
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=400, detail=f"OpenAI Whisper error: {str(e)}"
+            )
+
+        return response_json.get("text", "").strip()
+
+
+class LocalWhisperTranscriber(Transcriber):
+    """On-box CPU Whisper (faster-whisper) served from a pool of worker threads.
+
+    The model is loaded once per process and shared by ``workers`` threads;
+    CTranslate2 runs one inference per worker in parallel, so the loaded
+    weights are reused across requests instead of being reloaded per call.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        model: str = LOCAL_WHISPER_MODEL,
+        compute_type: str = LOCAL_WHISPER_COMPUTE_TYPE,
+        workers: int = LOCAL_WHISPER_WORKERS,
+        cpu_threads: int = LOCAL_WHISPER_CPU_THREADS,
+        download_root: str = LOCAL_WHISPER_MODEL_DIR,
+    ):
+        self.model_name = model
+        self.compute_type = compute_type
+        self.workers = max(1, workers)
+        self.cpu_threads = cpu_threads
+        self.download_root = download_root
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="local-asr"
+        )
+
+    def _load_model(self):
+        if self._model is not None:
+            return self._model
+        with self._model_lock:
+            if self._model is None:
+                try:
+                    from faster_whisper import WhisperModel
+                except ImportError as e:
+                    raise RuntimeError(
+                        "TRANSCRIBER_BACKEND=local requires the faster-whisper package "
+                        "(pip install -r requirements-local.txt)"
+                    ) from e
+
+                logging.info(
+                    f"Loading local Whisper model '{self.model_name}' "
+                    f"({self.compute_type}, {self.workers} workers)"
+                )
+                self._model = WhisperModel(
+                    self.model_name,
+                    device="cpu",
+                    compute_type=self.compute_type,
+                    cpu_threads=self.cpu_threads,
+                    num_workers=self.workers,
+                    download_root=self.download_root,
+                )
+        return self._model
+
+    def _transcribe_sync(self, audio) -> str:
+        model = self._load_model()
+        if isinstance(audio, bytes):
+            audio = io.BytesIO(audio)
+        segments, _ = model.transcribe(audio, beam_size=1)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    async def warmup(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._load_model)
+
+    async def transcribe(
+        self,
+        audio_bytes: bytes,
+        filename: str = "recording.wav",
+        content_type: str = "audio/wav",
+    ) -> str:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._executor, self._transcribe_sync, audio_bytes
+            )
+        except Exception as e:
+            logging.exception("Local Whisper transcription failed")
+            raise HTTPException(
+                status_code=500, detail=f"Local Whisper error: {str(e)}"
+            )
+
+    async def transcribe_pcm(
+        self, samples: np.ndarray, sample_rate: int = audio_utils.ASR_SAMPLE_RATE
+    ) -> str:
+        if sample_rate != audio_utils.ASR_SAMPLE_RATE:
+            return await super().transcribe_pcm(samples, sample_rate)
+        # faster-whisper takes 16 kHz float32 directly; skip the Opus round trip.
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._executor, self._transcribe_sync, samples
+            )
+        except Exception as e:
+            logging.exception("Local Whisper transcription failed")
+            raise HTTPException(
+                status_code=500, detail=f"Local Whisper error: {str(e)}"
+            )
+
+
+class StubTranscriber(Transcriber):
+    """Offline stand-in that needs no model and no network.
+
+    Emits one placeholder word per ``STUB_SECONDS_PER_WORD`` of detected
+    speech, so transcript length still tracks the audio in tests and local
+    development.
+    """
+
+    name = "stub"
+
+    async def transcribe(
+        self,
+        audio_bytes: bytes,
+        filename: str = "recording.wav",
+        content_type: str = "audio/wav",
+    ) -> str:
+        return await self.transcribe_pcm(await audio_utils.decode_pcm(audio_bytes))
+
+    async def transcribe_pcm(
+        self, samples: np.ndarray, sample_rate: int = audio_utils.ASR_SAMPLE_RATE
+    ) -> str:
+        activity = audio_utils.detect_voice_activity(samples, sample_rate)
+        words = int(round(activity.speaking_time_seconds / STUB_SECONDS_PER_WORD))
+        return " ".join(["speech"] * words)
+
+
+TRANSCRIBERS = {
+    OpenAIWhisperTranscriber.name: OpenAIWhisperTranscriber,
+    LocalWhisperTranscriber.name: LocalWhisperTranscriber,
+    StubTranscriber.name: StubTranscriber,
+}
+
+
+@lru_cache(maxsize=None)
+def get_transcriber(backend: str = None) -> Transcriber:
+    backend = (backend or TRANSCRIBER_BACKEND).lower()
+    if backend not in TRANSCRIBERS:
+        raise ValueError(
+            f"Unknown TRANSCRIBER_BACKEND '{backend}'. "
+            f"Expected one of: {', '.join(TRANSCRIBERS)}"
+        )
+    return TRANSCRIBERS[backend]()
+
+
+class StreamingTranscription:
+    """Incremental transcription of audio that is still being recorded.
+
+    Encoded frames are decoded as they arrive. Each partial pass transcribes
+    only the audio after the last committed point: everything before the most
+    recent pause is transcribed once and committed, and the open tail after
+    it is re-transcribed as the provisional part of the partial. At the end
+    only that short tail is left to transcribe.
+    """
+
+    def __init__(self, transcriber: Transcriber):
+        self.transcriber = transcriber
+        self.sample_rate = audio_utils.ASR_SAMPLE_RATE
+        self.decoder = audio_utils.StreamingPcmDecoder(self.sample_rate)
+        self._committed_text = []
+        self._committed_samples = 0
+        self._last_partial_samples = 0
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        await self.decoder.start()
+
+    async def feed(self, data: bytes):
+        await self.decoder.feed(data)
+
+    @property
+    def partial_due(self) -> bool:
+        new_seconds = (
+            self.decoder.decoded_samples - self._last_partial_samples
+        ) / float(self.sample_rate)
+        return new_seconds >= STREAM_PARTIAL_INTERVAL_SECONDS and not self._lock.locked()
+
+    def _commit_point(self, tail: np.ndarray) -> int:
+        """Sample offset in ``tail`` of the middle of its last long pause, or 0."""
+        activity = audio_utils.detect_voice_activity(tail, self.sample_rate)
+        mask = activity.speech_mask
+        if not mask.any():
+            return 0
+        frame_seconds = activity.frame_length / float(self.sample_rate)
+        min_gap = int(round(STREAM_COMMIT_PAUSE_SECONDS / frame_seconds))
+        speech_frames = np.flatnonzero(mask)
+        gaps = np.diff(speech_frames)
+        long_gaps = np.flatnonzero(gaps > min_gap)
+        if len(long_gaps) == 0:
+            return 0
+        last = long_gaps[-1]
+        middle = (speech_frames[last] + speech_frames[last + 1]) // 2
+        return int(middle * activity.frame_length)
+
+    async def partial(self) -> str:
+        async with self._lock:
+            pcm = self.decoder.samples()
+            self._last_partial_samples = len(pcm)
+            tail = pcm[self._committed_samples :]
+
+            cut = self._commit_point(tail)
+            if cut:
+                text = await self.transcriber.transcribe_pcm(tail[:cut], self.sample_rate)
+                if text:
+                    self._committed_text.append(text)
+                self._committed_samples += cut
+                tail = tail[cut:]
+
+            provisional = ""
+            if audio_utils.detect_voice_activity(tail, self.sample_rate).has_speech:
+                provisional = await self.transcriber.transcribe_pcm(tail, self.sample_rate)
+            return " ".join(self._committed_text + [provisional]).strip()
+
+    async def finish(self):
+        """Return ``(transcript, samples)`` for the whole recording."""
+        async with self._lock:
+            samples = await self.decoder.finish()
+            if samples is None:
+                raise ValueError("Could not decode streamed audio")
+
+            tail = samples[self._committed_samples :]
+            final_text = ""
+            if audio_utils.detect_voice_activity(tail, self.sample_rate).has_speech:
+                final_text = await self.transcriber.transcribe_pcm(tail, self.sample_rate)
+            transcript = " ".join(self._committed_text + [final_text]).strip()
+            return transcript, samples
+
+    def abort(self):
+        self.decoder.abort()
@@ -0,0 +1,489 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+# Whisper resamples everything to 16 kHz mono internally, so anything above
+# that is bandwidth we pay for on upload and the model throws away.
+ASR_SAMPLE_RATE = 16000
+ASR_OPUS_BITRATE = os.getenv("ASR_OPUS_BITRATE", "24k")
+
+# Voice-activity detection, all in 30 ms frames.
+VAD_FRAME_SECONDS = 0.03
+VAD_MIN_SPEECH_DB = -50.0  # absolute floor (dBFS) below which nothing is speech
+VAD_MAX_NOISE_FLOOR_DB = -40.0  # cap so answers with no silence still register
+VAD_NOISE_MARGIN_DB = 10.0  # voiced frames sit this far above the noise floor
+VAD_UNVOICED_MARGIN_DB = 4.0  # fricatives: quieter, but with a high ZCR
+VAD_UNVOICED_ZCR = 0.25
+VAD_MIN_GAP_SECONDS = 0.25  # shorter gaps are ordinary inter-word silence
+PAUSE_MIN_SECONDS = 0.5  # gaps at least this long count as pauses
+TRIM_PADDING_SECONDS = 0.2  # silence kept around speech in the ASR upload
+
+# Prosody features, computed on 40 ms windows every 10 ms.
+PROSODY_WINDOW_SECONDS = 0.04
+PROSODY_HOP_SECONDS = 0.01
+PROSODY_CHUNK_FRAMES = 1024  # frames per vectorized FFT batch, bounds memory
+PITCH_MIN_HZ = 75.0
+PITCH_MAX_HZ = 400.0
+PITCH_VOICING_THRESHOLD = 0.4  # normalized autocorrelation peak
+LONG_PAUSE_SECONDS = 1.5
+PROSODY_WORKERS = int(os.getenv("PROSODY_WORKERS", "2"))
+
+
+@dataclass
+class VoiceActivity:
+    speech_mask: np.ndarray  # bool per VAD frame
+    frame_length: int  # samples per VAD frame
+    speaking_time_seconds: float
+    pause_count: int
+    longest_pause_seconds: float
+
+    @property
+    def has_speech(self) -> bool:
+        return bool(self.speech_mask.any())
+
+
+@dataclass
+class NormalizedAudio:
+    samples: np.ndarray  # float32 mono PCM at ``sample_rate``
+    sample_rate: int
+    data: bytes  # compressed payload to send to the transcriber
+    voice_activity: VoiceActivity = None
+    filename: str = "recording.ogg"
+    content_type: str = "audio/ogg"
+
+    @property
+    def duration_seconds(self) -> float:
+        return len(self.samples) / float(self.sample_rate)
+
+
+async def _run_ffmpeg(args: list, input_bytes: bytes = None) -> bytes:
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG_BINARY,
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate(input=input_bytes)
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"ffmpeg exited with {process.returncode}: {stderr.decode(errors='ignore').strip()}"
+        )
+    return stdout
+
+
+async def encode_mp3(audio_bytes: bytes, bitrate: str) -> bytes:
+    """Re-encode speech to a mono MP3 at ``bitrate`` (e.g. "16k")."""
+    return await _run_ffmpeg(
+        [
+            "-i",
+            "pipe:0",
+            "-ac",
+            "1",
+            "-ar",
+            str(ASR_SAMPLE_RATE),
+            "-codec:a",
+            "libmp3lame",
+            "-b:a",
+            bitrate,
+            "-f",
+            "mp3",
+            "pipe:1",
+        ],
+        input_bytes=audio_bytes,
+    )
+
+
+async def decode_pcm(audio_bytes: bytes, sample_rate: int = ASR_SAMPLE_RATE) -> np.ndarray:
+    """Decode any container/codec ffmpeg understands straight to mono float32 PCM.
+
+    Compressed client formats (Opus/WebM, AAC/MP4, ...) are decoded directly at
+    the target rate; nothing is inflated to a full-rate WAV first. The input is
+    spooled to a private temp file because MP4 recordings are not always
+    readable from a non-seekable pipe.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".audio") as source:
+        source.write(audio_bytes)
+        source.flush()
+        raw = await _run_ffmpeg(
+            [
+                "-i",
+                source.name,
+                "-vn",
+                "-ac",
+                "1",
+                "-ar",
+                str(sample_rate),
+                "-f",
+                "f32le",
+                "pipe:1",
+            ]
+        )
+    return np.frombuffer(raw, dtype=np.float32)
+
+
+class StreamingPcmDecoder:
+    """Decode an upload to 16 kHz mono PCM while its bytes are still arriving.
+
+    Chunks are piped into a long-lived ffmpeg process as they land, so by the
+    time the last chunk arrives nearly all of the audio is already decoded.
+    Only streamable containers (WebM, Ogg, fragmented MP4, WAV) decode this
+    way; ``finish`` returns ``None`` when ffmpeg could not follow the stream
+    and the caller should fall back to ``decode_pcm`` on the full file.
+    """
+
+    def __init__(self, sample_rate: int = ASR_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.bytes_fed = 0
+        self._process = None
+        self._reader = None
+        self._pcm_chunks = []
+        self._pcm_bytes = 0
+        self._failed = False
+
+    @property
+    def decoded_samples(self) -> int:
+        return self._pcm_bytes // 4
+
+    @property
+    def decoded_seconds(self) -> float:
+        return self.decoded_samples / float(self.sample_rate)
+
+    def samples(self) -> np.ndarray:
+        """PCM decoded so far."""
+        raw = b"".join(self._pcm_chunks)
+        return np.frombuffer(raw[: len(raw) - len(raw) % 4], dtype=np.float32)
+
+    async def start(self):
+        self._process = await asyncio.create_subprocess_exec(
+            FFMPEG_BINARY,
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-i",
+            "pipe:0",
+            "-vn",
+            "-ac",
+            "1",
+            "-ar",
+            str(self.sample_rate),
+            "-f",
+            "f32le",
+            "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        self._reader = asyncio.ensure_future(self._read_pcm())
+
+    async def _read_pcm(self):
+        while True:
+            data = await self._process.stdout.read(64 * 1024)
+            if not data:
+                break
+            self._pcm_chunks.append(data)
+            self._pcm_bytes += len(data)
+
+    async def feed(self, data: bytes):
+        if self._failed:
+            return
+        try:
+            self._process.stdin.write(data)
+            await self._process.stdin.drain()
+            self.bytes_fed += len(data)
+        except (BrokenPipeError, ConnectionResetError):
+            self._failed = True
+
+    async def finish(self):
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            self._failed = True
+        await self._reader
+        await self._process.wait()
+        if self._failed or self._process.returncode != 0 or not self._pcm_bytes:
+            return None
+        return self.samples()
+
+    def abort(self):
+        self._failed = True
+        if self._process is not None and self._process.returncode is None:
+            self._process.kill()
+
+
+async def encode_opus(
+    samples: np.ndarray,
+    sample_rate: int = ASR_SAMPLE_RATE,
+    bitrate: str = ASR_OPUS_BITRATE,
+) -> bytes:
+    """Encode mono float32 PCM as speech-tuned Opus in an Ogg container."""
+    return await _run_ffmpeg(
+        [
+            "-f",
+            "f32le",
+            "-ar",
+            str(sample_rate),
+            "-ac",
+            "1",
+            "-i",
+            "pipe:0",
+            "-c:a",
+            "libopus",
+            "-b:a",
+            bitrate,
+            "-application",
+            "voip",
+            "-f",
+            "ogg",
+            "pipe:1",
+        ],
+        input_bytes=np.ascontiguousarray(samples, dtype=np.float32).tobytes(),
+    )
+
+
+def _frame(samples: np.ndarray, frame_length: int) -> np.ndarray:
+    """View ``samples`` as non-overlapping frames, dropping the ragged tail."""
+    n_frames = len(samples) // frame_length
+    return samples[: n_frames * frame_length].reshape(n_frames, frame_length)
+
+
+def _runs(mask: np.ndarray):
+    """Return (starts, ends) of the runs of True in a 1-D bool array."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def detect_voice_activity(
+    samples: np.ndarray, sample_rate: int = ASR_SAMPLE_RATE
+) -> VoiceActivity:
+    """Frame-energy / zero-crossing VAD over mono PCM.
+
+    Frames are speech when their energy clears an adaptive noise floor, or
+    when they are only slightly above it but have the high zero-crossing rate
+    of unvoiced consonants. Gaps shorter than ``VAD_MIN_GAP_SECONDS`` are
+    bridged so ordinary inter-word silence does not count as a pause.
+    """
+    frame_length = max(1, int(sample_rate * VAD_FRAME_SECONDS))
+    frames = _frame(samples, frame_length)
+    if len(frames) == 0:
+        return VoiceActivity(np.zeros(0, dtype=bool), frame_length, 0.0, 0, 0.0)
+
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    energy_db = 20.0 * np.log10(np.maximum(rms, 1e-10))
+    signs = np.signbit(frames)
+    zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+    noise_floor_db = min(np.percentile(energy_db, 10), VAD_MAX_NOISE_FLOOR_DB)
+    voiced = energy_db > max(noise_floor_db + VAD_NOISE_MARGIN_DB, VAD_MIN_SPEECH_DB)
+    unvoiced = (
+        (energy_db > max(noise_floor_db + VAD_UNVOICED_MARGIN_DB, VAD_MIN_SPEECH_DB))
+        & (zcr > VAD_UNVOICED_ZCR)
+    )
+    speech_mask = voiced | unvoiced
+
+    starts, ends = _runs(speech_mask)
+    min_gap_frames = int(round(VAD_MIN_GAP_SECONDS / VAD_FRAME_SECONDS))
+    short_gaps = (starts[1:] - ends[:-1]) < min_gap_frames
+    bridge = np.zeros(len(speech_mask) + 1, dtype=np.int32)
+    np.add.at(bridge, ends[:-1][short_gaps], 1)
+    np.add.at(bridge, starts[1:][short_gaps], -1)
+    speech_mask |= np.cumsum(bridge)[:-1] > 0
+
+    frame_seconds = frame_length / float(sample_rate)
+    starts, ends = _runs(speech_mask)
+    pauses = (starts[1:] - ends[:-1]) * frame_seconds
+    pauses = pauses[pauses >= PAUSE_MIN_SECONDS]
+
+    return VoiceActivity(
+        speech_mask=speech_mask,
+        frame_length=frame_length,
+        speaking_time_seconds=float(speech_mask.sum() * frame_seconds),
+        pause_count=int(len(pauses)),
+        longest_pause_seconds=float(pauses.max()) if len(pauses) else 0.0,
+    )
+
+
+def trim_silence(
+    samples: np.ndarray,
+    activity: VoiceActivity,
+    sample_rate: int = ASR_SAMPLE_RATE,
+) -> np.ndarray:
+    """Drop leading/trailing silence and shorten long pauses.
+
+    Every speech frame keeps ``TRIM_PADDING_SECONDS`` of context on each side,
+    so a pause survives as at most twice the padding.
+    """
+    if not activity.has_speech:
+        return samples
+
+    pad_frames = int(round(TRIM_PADDING_SECONDS * sample_rate / activity.frame_length))
+    n_frames = len(activity.speech_mask)
+    dilated = np.convolve(
+        activity.speech_mask.astype(np.int32), np.ones(2 * pad_frames + 1, dtype=np.int32)
+    )
+    keep = dilated[pad_frames : pad_frames + n_frames] > 0
+    framed = _frame(samples, activity.frame_length)
+    return framed[keep].reshape(-1)
+
+
+async def normalize_for_asr(
+    audio_bytes: bytes, samples: np.ndarray = None
+) -> NormalizedAudio:
+    """Downmix, resample to 16 kHz, trim silence and re-encode as compact Opus.
+
+    ``samples`` may carry PCM already decoded while the upload was streaming
+    in, in which case the upload is not decoded a second time.
+    """
+    if samples is None:
+        samples = await decode_pcm(audio_bytes)
+    if samples.size == 0:
+        raise ValueError("Audio contains no decodable samples")
+
+    activity = detect_voice_activity(samples)
+    speech = trim_silence(samples, activity)
+    data = await encode_opus(speech)
+    normalized = NormalizedAudio(
+        samples=samples,
+        sample_rate=ASR_SAMPLE_RATE,
+        data=data,
+        voice_activity=activity,
+    )
+
+    logging.info(
+        f"Normalized audio for ASR: {len(audio_bytes)} -> {len(data)} bytes "
+        f"({normalized.duration_seconds:.1f}s, "
+        f"{activity.speaking_time_seconds:.1f}s speech, {activity.pause_count} pauses)"
+    )
+    return normalized
+
+
+@dataclass
+class ProsodyMetrics:
+    pitch_variance: float  # semitones^2 around the speaker's median pitch
+    energy_variance: float  # dB^2 over speech frames
+    pause_ratio: float  # fraction of the recording that is not speech
+    speech_rate: float  # syllable nuclei per second of speaking time
+    long_pause_count: int
+
+
+def _pitch_and_energy(frames: np.ndarray, sample_rate: int):
+    """Autocorrelation pitch (Hz, NaN when unvoiced) and RMS energy (dB) per frame."""
+    window = np.hanning(frames.shape[1]).astype(np.float32)
+    windowed = (frames - frames.mean(axis=1, keepdims=True)) * window
+    n_fft = 1 << int(np.ceil(np.log2(2 * frames.shape[1])))
+    spectrum = np.fft.rfft(windowed, n=n_fft, axis=1)
+    autocorr = np.fft.irfft(np.abs(spectrum) ** 2, n=n_fft, axis=1)[:, : frames.shape[1]]
+
+    energy = autocorr[:, 0]
+    min_lag = int(sample_rate / PITCH_MAX_HZ)
+    max_lag = min(int(sample_rate / PITCH_MIN_HZ), frames.shape[1] - 1)
+    search = autocorr[:, min_lag : max_lag + 1] / np.maximum(energy, 1e-10)[:, None]
+    best = np.argmax(search, axis=1)
+    peak = search[np.arange(len(search)), best]
+
+    pitch = sample_rate / (best + min_lag).astype(np.float64)
+    pitch[peak < PITCH_VOICING_THRESHOLD] = np.nan
+
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    return pitch, 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+
+def extract_prosody_features(
+    samples: np.ndarray,
+    activity: VoiceActivity,
+    sample_rate: int = ASR_SAMPLE_RATE,
+) -> ProsodyMetrics:
+    """Compute waveform-level delivery features for one answer.
+
+    CPU-bound; call through ``analyze_prosody`` from request handlers so it
+    runs in the process pool instead of on the event loop.
+    """
+    window = int(sample_rate * PROSODY_WINDOW_SECONDS)
+    hop = int(sample_rate * PROSODY_HOP_SECONDS)
+    duration = len(samples) / float(sample_rate)
+    if len(samples) < window or not activity.has_speech:
+        return ProsodyMetrics(0.0, 0.0, 1.0, 0.0, 0)
+
+    frames = np.lib.stride_tricks.sliding_window_view(samples, window)[::hop]
+    pitch_chunks, energy_chunks = [], []
+    for start in range(0, len(frames), PROSODY_CHUNK_FRAMES):
+        pitch, energy = _pitch_and_energy(
+            frames[start : start + PROSODY_CHUNK_FRAMES], sample_rate
+        )
+        pitch_chunks.append(pitch)
+        energy_chunks.append(energy)
+    pitch = np.concatenate(pitch_chunks)
+    energy_db = np.concatenate(energy_chunks)
+
+    # Map each prosody frame onto the VAD frame containing its centre.
+    centres = np.arange(len(frames)) * hop + window // 2
+    vad_index = np.minimum(centres // activity.frame_length, len(activity.speech_mask) - 1)
+    in_speech = activity.speech_mask[vad_index]
+
+    voiced_pitch = pitch[in_speech & ~np.isnan(pitch)]
+    if len(voiced_pitch) > 1:
+        semitones = 12.0 * np.log2(voiced_pitch / np.median(voiced_pitch))
+        pitch_variance = float(np.var(semitones))
+    else:
+        pitch_variance = 0.0
+
+    speech_energy = energy_db[in_speech]
+    energy_variance = float(np.var(speech_energy)) if len(speech_energy) > 1 else 0.0
+
+    # Syllable nuclei: local maxima of the smoothed envelope inside speech
+    # that stand out from the typical speech level.
+    envelope = np.convolve(energy_db, np.ones(5) / 5.0, mode="same")
+    is_peak = np.zeros(len(envelope), dtype=bool)
+    is_peak[1:-1] = (envelope[1:-1] > envelope[:-2]) & (envelope[1:-1] >= envelope[2:])
+    nuclei = is_peak & in_speech & (envelope > np.median(speech_energy) - 3.0)
+    speaking_time = activity.speaking_time_seconds
+    speech_rate = float(nuclei.sum() / speaking_time) if speaking_time > 0 else 0.0
+
+    frame_seconds = activity.frame_length / float(sample_rate)
+    starts, ends = _runs(activity.speech_mask)
+    pauses = (starts[1:] - ends[:-1]) * frame_seconds
+
+    return ProsodyMetrics(
+        pitch_variance=pitch_variance,
+        energy_variance=energy_variance,
+        pause_ratio=float(max(0.0, 1.0 - speaking_time / duration)),
+        speech_rate=speech_rate,
+        long_pause_count=int(np.sum(pauses >= LONG_PAUSE_SECONDS)),
+    )
+
+
+_prosody_pool = None
+
+
+def _get_prosody_pool() -> ProcessPoolExecutor:
+    global _prosody_pool
+    if _prosody_pool is None:
+        # spawn: forking a process that holds Mongo/Redis client threads is unsafe.
+        _prosody_pool = ProcessPoolExecutor(
+            max_workers=PROSODY_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _prosody_pool
+
+
+async def analyze_prosody(
+    samples: np.ndarray, activity: VoiceActivity, sample_rate: int = ASR_SAMPLE_RATE
+) -> ProsodyMetrics:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_prosody_pool(), extract_prosody_features, samples, activity, sample_rate
+    )
@@ -2,7 +2,13 @@ from datetime import datetime, timedelta, timezone
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from bson import ObjectId
+from bson.errors import InvalidId
+from cachetools import TLRUCache, TTLCache
+from models.users import User
+import hashlib
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,6 +18,20 @@ SECRET_KEY = os.getenv("SECRET_KEY")  # Use a strong secret key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 180
 
+# Per-worker caches. Verified tokens are kept until they expire; user
+# documents for a short TTL, and are dropped from this worker's cache when
+# the user is written here. Other workers see a write within the TTL.
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_TTL_SECONDS = int(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "30"))
+
+_token_cache = TLRUCache(
+    maxsize=AUTH_TOKEN_CACHE_SIZE,
+    ttu=lambda _key, payload, _now: payload["exp"],
+    timer=time.time,
+)
+_user_cache = TTLCache(maxsize=AUTH_USER_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL_SECONDS)
+
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -20,16 +40,61 @@ def create_access_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def create_user_access_token(user: User):
+    """Token for an app user, carrying the user id for the cached lookup."""
+    return create_access_token(data={"sub": user.email, "uid": str(user.id)})
+
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
+def verify_token(token: str) -> dict:
+    """Decode and verify a JWT, memoized by token hash until it expires."""
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    payload = _token_cache.get(key)
+    if payload is not None:
+        return payload
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid authentication")
-        return email
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Invalid authentication")
+    if "exp" in payload:
+        _token_cache[key] = payload
+    return payload
+
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
+    return verify_token(token)["sub"]
+
+
+async def get_current_user_doc(token: str = Depends(oauth2_scheme)) -> User:
+    """The authenticated user's document, from the per-worker cache.
+
+    Each request gets its own copy, so endpoints can modify and save it.
+    Endpoints that write a user must call ``invalidate_user`` afterwards.
+    """
+    payload = verify_token(token)
+    user_id = payload.get("uid")
+    if user_id:
+        user = _user_cache.get(user_id)
+        if user is None:
+            try:
+                user = await User.get(ObjectId(user_id))
+            except InvalidId:
+                raise HTTPException(status_code=401, detail="Invalid authentication")
+            if user:
+                _user_cache[user_id] = user
+    else:
+        # Tokens issued before the user id was embedded.
+        user = await User.find_one(User.email == payload["sub"])
+
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+    return user.model_copy(deep=True)
+
+
+def invalidate_user(user_id):
+    _user_cache.pop(str(user_id), None)
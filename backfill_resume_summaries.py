@@ -0,0 +1,177 @@
+"""Backfill resume_summary and the skill index for users missing them.
+
+Users are processed in _id order, one page at a time, with bounded
+concurrency. After each page the last _id is written to a checkpoint file,
+so an interrupted run resumes where it stopped:
+
+    python backfill_resume_summaries.py --concurrency 8
+    python backfill_resume_summaries.py --restart   # ignore the checkpoint
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from beanie import init_beanie
+from bson import ObjectId
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from models.company import Company
+from models.employee import Employee
+from models.resume_summary import ResumeSummary
+from models.users import User
+import resume_utils
+
+load_dotenv()
+
+DEFAULT_CHECKPOINT = os.path.join("tmp_files", "backfill_resume_summaries.json")
+
+
+async def init_db():
+    """Initialize the database connection."""
+    client = AsyncIOMotorClient(os.getenv("MONGO_URI"))
+    db_name = os.getenv("MONGO_DB_NAME", "mockai-tech")
+    await init_beanie(
+        database=client[db_name],
+        document_models=[User, Company, Employee, ResumeSummary],
+    )
+    print(f"Connected to MongoDB database: {db_name}")
+    return client
+
+
+def load_checkpoint(path: str):
+    try:
+        with open(path) as f:
+            return ObjectId(json.load(f)["last_id"])
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path: str, last_id: ObjectId):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"last_id": str(last_id)}, f)
+    os.replace(tmp_path, path)
+
+
+def missing_summary_query(after_id: ObjectId = None) -> dict:
+    query = {
+        "resume": {"$nin": [None, ""]},
+        "$or": [{"resume_summary": {"$in": [None, ""]}}, {"skills": None}],
+    }
+    if after_id is not None:
+        query["_id"] = {"$gt": after_id}
+    return query
+
+
+class Progress:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.processed = 0
+        self.summarized = 0
+        self.failed = 0
+
+    def report(self, label: str = "Progress"):
+        elapsed = time.monotonic() - self.started
+        rate = self.processed / elapsed if elapsed else 0.0
+        print(
+            f"{label}: {self.processed} users in {elapsed:.1f}s "
+            f"({rate:.2f}/s), {self.summarized} summarized, {self.failed} failed"
+        )
+
+
+async def backfill_user(user: dict, progress: Progress):
+    resume = user["resume"]
+    try:
+        resume_text = await resume_utils.extract_resume_text_from_s3(resume)
+        profile = await resume_utils.get_resume_profile(resume_text)
+        if not profile["resume_summary"]:
+            raise Exception("empty summary")
+        # Skip users who replaced their resume while this one was summarized.
+        await User.get_motor_collection().update_one(
+            {"_id": user["_id"], "resume": resume},
+            {"$set": profile},
+        )
+        if "skills" not in profile:
+            raise Exception("skill extraction failed")
+        progress.summarized += 1
+    except Exception as e:
+        progress.failed += 1
+        print(f"Failed to summarize resume {resume} for user {user['_id']}: {e}")
+    finally:
+        progress.processed += 1
+
+
+async def backfill(
+    concurrency: int, batch_size: int, checkpoint: str, restart: bool, limit: int
+):
+    after_id = None if restart else load_checkpoint(checkpoint)
+    if after_id is not None:
+        print(f"Resuming after user {after_id}")
+
+    users = User.get_motor_collection()
+    remaining = await users.count_documents(missing_summary_query(after_id))
+    print(f"{remaining} users with a resume but no summary or skills")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    progress = Progress()
+
+    async def run(user: dict):
+        async with semaphore:
+            await backfill_user(user, progress)
+
+    while not limit or progress.processed < limit:
+        page_size = batch_size
+        if limit:
+            page_size = min(page_size, limit - progress.processed)
+        page = (
+            await users.find(missing_summary_query(after_id), {"_id": 1, "resume": 1})
+            .sort("_id", 1)
+            .limit(page_size)
+            .to_list(length=page_size)
+        )
+        if not page:
+            break
+
+        await asyncio.gather(*(run(user) for user in page))
+        # Failed users stay behind the checkpoint; --restart retries them.
+        after_id = page[-1]["_id"]
+        save_checkpoint(checkpoint, after_id)
+        progress.report()
+
+    progress.report("Done")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument(
+        "--restart", action="store_true", help="start from the first user"
+    )
+    parser.add_argument(
+        "--limit", type=int, default=0, help="stop after this many users"
+    )
+    args = parser.parse_args()
+
+    client = await init_db()
+    try:
+        await backfill(
+            args.concurrency,
+            args.batch_size,
+            args.checkpoint,
+            args.restart,
+            args.limit,
+        )
+    finally:
+        client.close()
+        print("MongoDB connection closed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""Benchmark full vs early-exit resume text extraction.
+
+Generates a multi-page text PDF with PyMuPDF (same seed, same document on
+every run) and times ``common_utils.extract_pdf_text`` reading every page
+against the default, which stops once RESUME_CHAR_LIMIT characters are
+collected:
+
+    python bench_resume_extraction.py
+    python bench_resume_extraction.py --pages 40 --repeat 20
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import timeit
+
+import fitz
+
+import common_utils
+
+WORDS = (
+    "python fastapi mongodb redis docker kubernetes aws backend api design "
+    "testing ownership mentoring migration latency throughput pipeline data "
+    "engineer led built shipped reduced improved scaled deployed designed"
+).split()
+
+
+def make_resume_pdf(pages: int, seed: int = 0) -> bytes:
+    """A ``pages``-page PDF whose pages are filled with pseudo-random words."""
+    rng = random.Random(seed)
+    with fitz.open() as doc:
+        for _ in range(pages):
+            page = doc.new_page()
+            text = " ".join(rng.choice(WORDS) for _ in range(600))
+            page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=10)
+        return doc.tobytes()
+
+
+def full_extraction(data: bytes) -> str:
+    text = common_utils.extract_pdf_text(data, char_limit=sys.maxsize)
+    return text[: common_utils.RESUME_CHAR_LIMIT]
+
+
+def early_exit_extraction(data: bytes) -> str:
+    return common_utils.extract_pdf_text(data)
+
+
+def bench(label: str, fn, data: bytes, number: int, repeat: int) -> float:
+    runs = timeit.repeat(lambda: fn(data), number=number, repeat=repeat)
+    per_call = [run / number * 1000 for run in runs]
+    best = min(per_call)
+    print(
+        f"{label:<12} best {best:8.2f} ms   "
+        f"median {statistics.median(per_call):8.2f} ms   ({repeat}x{number} calls)"
+    )
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--number", type=int, default=5, help="calls per timing")
+    parser.add_argument("--repeat", type=int, default=10, help="timings per mode")
+    args = parser.parse_args()
+
+    data = make_resume_pdf(args.pages, args.seed)
+    print(
+        f"{args.pages}-page PDF, {len(data)} bytes, "
+        f"char limit {common_utils.RESUME_CHAR_LIMIT}"
+    )
+    # Both modes must return the same text for the comparison to be fair.
+    assert full_extraction(data) == early_exit_extraction(data)
+
+    full = bench("full", full_extraction, data, args.number, args.repeat)
+    early = bench("early exit", early_exit_extraction, data, args.number, args.repeat)
+    print(f"speedup      {full / early:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
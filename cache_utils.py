@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Optional
+
+import redis.asyncio as redis_asyncio
+from redis.exceptions import RedisError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRANSCRIPTION_CACHE_TTL_SECONDS = int(
+    os.getenv("TRANSCRIPTION_CACHE_TTL_SECONDS", str(24 * 60 * 60))
+)
+# Upper bound on one computation; a crashed worker's lock frees itself after this.
+INFLIGHT_LOCK_SECONDS = 180
+INFLIGHT_POLL_SECONDS = 0.5
+
+# Computations running in this worker, shared by concurrent identical requests.
+_inflight: Dict[str, asyncio.Task] = {}
+
+
+async def get_redis():
+    redis = redis_asyncio.from_url(os.getenv("REDIS_URI"), decode_responses=True)
+    try:
+        yield redis
+    finally:
+        await redis.close()
+
+
+def transcription_cache_key(audio_bytes: bytes, question_id: str) -> str:
+    audio_hash = hashlib.sha256(audio_bytes).hexdigest()
+    return f"transcription:{question_id}:{audio_hash}"
+
+
+async def _compute_once(
+    redis: redis_asyncio.Redis,
+    key: str,
+    compute: Callable[[], Awaitable[dict]],
+    ttl: int,
+    should_cache: Optional[Callable[[dict], bool]] = None,
+) -> dict:
+    """Run ``compute`` in at most one worker at a time and store its result.
+
+    Workers that lose the lock race poll for the winner's result. If the
+    winner fails, it releases the lock and the next poller computes instead.
+    """
+    lock_key = f"{key}:lock"
+    while True:
+        try:
+            acquired = await redis.set(lock_key, "1", nx=True, ex=INFLIGHT_LOCK_SECONDS)
+        except RedisError as e:
+            logging.warning(f"Redis unavailable, computing {key} uncached: {e}")
+            return await compute()
+
+        if acquired:
+            try:
+                result = await compute()
+                if should_cache is not None and not should_cache(result):
+                    # Pollers find no result once the lock is gone and
+                    # compute their own.
+                    return result
+                # Publish before unlocking so pollers never see neither.
+                try:
+                    await redis.set(key, json.dumps(result), ex=ttl)
+                except RedisError as e:
+                    logging.warning(f"Could not cache {key}: {e}")
+                return result
+            finally:
+                try:
+                    await redis.delete(lock_key)
+                except RedisError as e:
+                    logging.warning(f"Could not release {lock_key}: {e}")
+
+        await asyncio.sleep(INFLIGHT_POLL_SECONDS)
+        try:
+            cached = await redis.get(key)
+        except RedisError as e:
+            logging.warning(f"Redis unavailable, computing {key} uncached: {e}")
+            return await compute()
+        if cached:
+            return json.loads(cached)
+
+
+async def get_or_compute(
+    redis: redis_asyncio.Redis,
+    key: str,
+    compute: Callable[[], Awaitable[dict]],
+    ttl: int = TRANSCRIPTION_CACHE_TTL_SECONDS,
+    should_cache: Optional[Callable[[dict], bool]] = None,
+) -> dict:
+    """Return the cached result for ``key``, computing it at most once.
+
+    Concurrent duplicates in this worker await the same task; duplicates in
+    other workers are coalesced through a Redis lock. If Redis is unavailable
+    the result is computed directly so requests never fail on the cache.
+    Results for which ``should_cache`` returns False are not stored.
+    """
+    try:
+        cached = await redis.get(key)
+        if cached:
+            logging.info(f"Cache hit for {key}")
+            return json.loads(cached)
+    except RedisError as e:
+        logging.warning(f"Redis unavailable, computing {key} uncached: {e}")
+        return await compute()
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(
+            _compute_once(redis, key, compute, ttl, should_cache)
+        )
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        logging.info(f"Joining in-flight computation for {key}")
+
+    # Shielded so one client disconnecting does not cancel work others await.
+    return await asyncio.shield(task)
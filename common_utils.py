@@ -1,30 +1,121 @@
 import requests
 import fitz
-import tempfile
 import os
-import logging
 import re
+import resource
+import signal
 
-def extract_resume_text_from_s3_url(resume_url: str, char_limit: int = 3000) -> str:
-    try:
-        response = requests.get(resume_url, timeout=10)
+RESUME_CHAR_LIMIT = 3000
+RESUME_MAX_BYTES = int(os.getenv("RESUME_MAX_BYTES", str(10 * 1024 * 1024)))
+RESUME_MAX_PAGES = int(os.getenv("RESUME_MAX_PAGES", "50"))
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+
+
+class ResumeTooLarge(ValueError):
+    pass
+
+
+def extract_pdf_text(
+    data: bytes,
+    char_limit: int = RESUME_CHAR_LIMIT,
+    max_pages: int = RESUME_MAX_PAGES,
+    max_bytes: int = RESUME_MAX_BYTES,
+) -> str:
+    """Extract up to ``char_limit`` characters from an in-memory PDF.
+
+    The document is opened straight from the buffer and pages are read
+    only until enough text has been collected, so a long resume costs no
+    more than its first few pages. Oversized files and documents with more
+    than ``max_pages`` pages raise ResumeTooLarge before any page is parsed.
+    """
+    if len(data) > max_bytes:
+        raise ResumeTooLarge(f"Resume is {len(data)} bytes, limit is {max_bytes}")
+
+    parts = []
+    collected = 0
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        if doc.page_count > max_pages:
+            raise ResumeTooLarge(
+                f"Resume has {doc.page_count} pages, limit is {max_pages}"
+            )
+        for page in doc:
+            text = page.get_text()
+            parts.append(text)
+            collected += len(text)
+            if collected >= char_limit:
+                break
+
+    return "".join(parts)[:char_limit]
+
+
+def download_resume(resume_url: str) -> bytes:
+    """Download a resume into memory, stopping one chunk past the size limit."""
+    with requests.get(resume_url, timeout=10, stream=True) as response:
         if response.status_code != 200:
             raise Exception(f"Failed to download resume: HTTP {response.status_code}")
 
-        temp_path = os.path.join(tempfile.gettempdir(), "temp_resume.pdf")
-        with open(temp_path, "wb") as f:
-            f.write(response.content)
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > RESUME_MAX_BYTES:
+                break
 
-        text = ""
-        with fitz.open(temp_path) as doc:
-            for page in doc:
-                text += page.get_text()
+    return b"".join(chunks)
 
-        return text[:char_limit]
 
-    except Exception as e:
-        logging.error(f"Error processing resume from S3: {e}")
-        return ""
+def limit_parser_memory(memory_bytes: int):
+    """Process pool initializer: cap the worker's address space."""
+    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+
+def limit_task_cpu(cpu_seconds: int):
+    """Give the current pool task ``cpu_seconds`` of CPU time.
+
+    RLIMIT_CPU counts the whole process lifetime, so the soft limit is moved
+    to the CPU time used so far plus ``cpu_seconds``; a task that runs past
+    it receives SIGXCPU and the worker dies. The hard limit is left alone so
+    it can be raised again for the next task.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = usage.ru_utime + usage.ru_stime
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(used) + cpu_seconds + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def run_with_limits(cpu_seconds: int, wall_seconds: float, fn, *args):
+    """Run ``fn(*args)`` in a pool worker under CPU and wall-clock limits.
+
+    Both limits kill only this worker: SIGXCPU from ``limit_task_cpu`` and
+    SIGALRM from the interval timer terminate the process by default, even
+    while MuPDF is busy in C code. Running out of address space surfaces as
+    MemoryError in the caller.
+    """
+    limit_task_cpu(cpu_seconds)
+    signal.setitimer(signal.ITIMER_REAL, wall_seconds)
+    try:
+        return fn(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def ocr_pdf_page(data: bytes, page_number: int, dpi: int = OCR_DPI):
+    """OCR one page of an in-memory PDF; None if the page does not exist.
+
+    The page is rendered at ``dpi`` and read by Tesseract through PyMuPDF.
+    Meant for the parser pool, through ``run_with_limits``.
+    """
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        if page_number >= min(doc.page_count, RESUME_MAX_PAGES):
+            return None
+        page = doc[page_number]
+        textpage = page.get_textpage_ocr(dpi=dpi, full=True, language=OCR_LANGUAGE)
+        return page.get_text(textpage=textpage)
 
 
 def extract_json_from_llm_text(text: str) -> str:
@@ -17,16 +17,8 @@ client = AsyncIOMotorClient(MONGO_URI)
 db = client[MONGO_DB_NAME]
 
 
-async def initialize_database():
-    try:
-        # List collection names (await because it's an async operation)
-        collections = await db.list_collection_names()
-        logging.info(
-            f"Connected to database '{MONGO_DB_NAME}'. Collections: {collections}"
-        )
-    except Exception as e:
-        logging.error("Error listing collections: %s", e)
-
+def document_models():
+    """Every class defined in the modules of the models package."""
     classes = []
     folder_path = "models"
 
@@ -47,6 +39,20 @@ async def initialize_database():
                 # Check if the member is a class and is defined in this module
                 if inspect.isclass(obj) and obj.__module__ == module_name:
                     classes.append(eval(f"{module_name}.{name}"))
+    return classes
+
+
+async def initialize_database():
+    try:
+        # List collection names (await because it's an async operation)
+        collections = await db.list_collection_names()
+        logging.info(
+            f"Connected to database '{MONGO_DB_NAME}'. Collections: {collections}"
+        )
+    except Exception as e:
+        logging.error("Error listing collections: %s", e)
+
+    classes = document_models()
     logging.info(classes)
     await init_beanie(database=db, document_models=classes)
 
@@ -7,8 +7,9 @@ from services import users_service
 from services import interview_service
 from services import company_service
 from services import aptitude_service
-import redis.asyncio as redis_asyncio
-import os
+import archive_utils
+import asr_utils
+import cache_utils
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -34,17 +35,18 @@ app.add_middleware(
 )
 
 
-async def get_redis():
-    redis = redis_asyncio.from_url(os.getenv("REDIS_URI"), decode_responses=True)
-    try:
-        yield redis
-    finally:
-        await redis.close()
-
-
 @app.on_event("startup")
 async def startup_event():
     await initialize_database()
+    await asr_utils.get_transcriber().warmup()
+    archiver = archive_utils.get_archiver()
+    archiver.start()
+    await archiver.apply_lifecycle()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await archive_utils.get_archiver().stop()
 
 
 @app.get("/")
@@ -56,7 +58,7 @@ app.include_router(
     users_service.router,
     prefix="/user",
     tags=["User"],
-    dependencies=[Depends(get_redis)],
+    dependencies=[Depends(cache_utils.get_redis)],
 )
 
 app.include_router(interview_service.router, prefix="/interview", tags=["Interview"])
@@ -101,6 +101,14 @@ class PaidReview(Document):
     # learning resources can also be added here
 
 
+class ProsodyFeatures(Document):
+    pitch_variance: Optional[float] = None  # semitones^2
+    energy_variance: Optional[float] = None  # dB^2
+    pause_ratio: Optional[float] = None  # 0–1
+    speech_rate: Optional[float] = None  # syllables per speaking second
+    long_pause_count: Optional[int] = None
+
+
 class SpeechAnalysis(Document):
 
     transcript: Optional[str] = None
@@ -111,6 +119,14 @@ class SpeechAnalysis(Document):
     clarity_score: Optional[float] = None
     words_per_minute: Optional[float] = None
     answer_relevance_score: Optional[float] = None
+    speaking_time_seconds: Optional[float] = None  # time_seconds minus silence
+    pause_count: Optional[int] = None
+    longest_pause_seconds: Optional[float] = None
+    prosody: Optional[ProsodyFeatures] = None
+    # "pending" until the background scoring fills in the fields above
+    analysis_status: Optional[str] = None
+    # Object key of the original recording in the answer-audio archive
+    audio_archive_key: Optional[str] = None
 
 
 class QuestionResponse(Document):
@@ -133,6 +149,7 @@ class Interview(Document):
     payment_id: Optional[Link[Payment]] = None
     user_aptitude_id: Optional[Link[UserAptitude]] = None
     generation_type: Optional[str] = None
+    greeting: Optional[str] = None
     question_responses: Optional[List[QuestionResponse]] = None
     customer_feedback: Optional[CustomerFeedback] = None
 
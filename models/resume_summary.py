@@ -0,0 +1,26 @@
+from beanie import Document, Indexed
+from pydantic import Field, ConfigDict
+from bson import ObjectId
+from datetime import datetime
+from typing import List, Optional
+
+
+class ResumeSummary(Document):
+    """Summary of one resume text, shared by every upload with the same text."""
+
+    id: ObjectId = Field(default_factory=lambda: ObjectId())
+    # sha256 of the whitespace-normalized extracted text
+    content_hash: Indexed(str, unique=True)
+    prompt_version: str
+    summary: str
+    skills_version: Optional[str] = None
+    skills: Optional[List[str]] = None
+    tools: Optional[List[str]] = None
+    domains: Optional[List[str]] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    class Settings:
+        name = "resume_summaries"
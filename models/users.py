@@ -1,8 +1,9 @@
-from typing import Optional
+from typing import List, Optional
 from beanie import Document, Link
 from models.company import Company
 from pydantic import Field, StringConstraints, ConfigDict
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 from typing_extensions import Annotated
 
 IndianMobile = Annotated[str, StringConstraints(pattern=r"^[6-9]\d{9}$")]
@@ -23,9 +24,19 @@ class User(Document):
     model_config = ConfigDict(arbitrary_types_allowed=True)
     resume_summary: Optional[str] = None
     is_feedback_given: Optional[bool] = False
+    # Normalized terms extracted from the resume summary, for candidate search
+    skills: Optional[List[str]] = None
+    tools: Optional[List[str]] = None
+    domains: Optional[List[str]] = None
 
     class Settings:
         name = "users"
+        # Multikey indexes; the organization key lets company searches
+        # narrow to their own candidates inside the index.
+        indexes = [
+            IndexModel([(field, ASCENDING), ("organization.$id", ASCENDING)])
+            for field in ("skills", "tools", "domains")
+        ]
 
     def resume_url(self) -> Optional[str]:
         if not self.resume:
@@ -7,6 +7,7 @@ from langchain_community.chat_models import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 import json
+import common_utils
 
 load_dotenv()
 
@@ -449,6 +450,10 @@ def generate_feedback_paid(qaa: str, years_of_experience: int):
     return response.get("text", "").strip()
 
 
+# Bump whenever the resume summary prompt changes so stored summaries are refreshed.
+RESUME_SUMMARY_PROMPT_VERSION = "1"
+
+
 def create_resume_summary_agent():
     template = """
     Carefully read and analyze the following resume content.
@@ -486,6 +491,42 @@ def summarize_resume(resume_text: str) -> str:
         return ""
 
 
+# Bump whenever the skill extraction prompt changes so stored skills are refreshed.
+RESUME_SKILLS_PROMPT_VERSION = "1"
+
+
+def create_resume_skills_agent():
+    template = """
+    Read the following summary of a candidate's resume and list what it mentions.
+
+    Summary:
+    {resume_summary}
+
+    Output a JSON object in this format with no extra text:
+    {{
+      "skills": ["list", "of", "skills"],     // e.g. "machine learning", "system design"
+      "tools": ["list", "of", "tools"],       // languages, frameworks, libraries, platforms
+      "domains": ["list", "of", "domains"]    // industries, e.g. "fintech", "healthcare"
+    }}
+
+    Use short lowercase names, one item per entry, and leave a list empty rather than guessing.
+    """
+
+    prompt = PromptTemplate(template=template, input_variables=["resume_summary"])
+    return LLMChain(llm=free_llm, prompt=prompt)
+
+
+def extract_resume_skills(resume_summary: str) -> dict:
+    try:
+        wrapper = create_resume_skills_agent()
+        response = wrapper.invoke({"resume_summary": resume_summary})
+        text = common_utils.extract_json_from_llm_text(response.get("text", ""))
+        return json.loads(text)
+    except Exception as e:
+        logging.error(f"LangChain resume skill extraction failed: {e}")
+        return {}
+
+
 def create_audio_analysis_agent_with_question():
     template = """
     You are a communication coach evaluating an interview candidate's spoken response.
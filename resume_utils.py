@@ -0,0 +1,509 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import boto3
+import redis.asyncio as redis_asyncio
+from botocore.exceptions import ClientError
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from dotenv import load_dotenv
+
+from models.resume_summary import ResumeSummary
+from models.users import User
+import auth
+import cache_utils
+import common_utils
+import openai_utils
+
+load_dotenv()
+
+RESUME_BUCKET = "mockai-resume"
+RESUME_URL = f"https://{RESUME_BUCKET}.s3.amazonaws.com/{{}}"
+
+# Direct uploads: the browser POSTs the file straight to the bucket using a
+# short-lived presigned form, then tells us the key so we can verify it.
+RESUME_UPLOAD_PREFIX = "uploads/"
+RESUME_UPLOAD_CONTENT_TYPES = {"application/pdf"}
+RESUME_PRESIGN_EXPIRES_SECONDS = int(os.getenv("RESUME_PRESIGN_EXPIRES_SECONDS", "900"))
+
+# Resume parsing runs in a separate pool of processes so a pathological PDF
+# cannot stall the event loop. Each parse has a CPU and a wall-clock budget,
+# each worker a cap on its address space, and workers are replaced after a
+# fixed number of parses.
+RESUME_PARSE_WORKERS = int(os.getenv("RESUME_PARSE_WORKERS", "2"))
+RESUME_PARSE_CPU_SECONDS = int(os.getenv("RESUME_PARSE_CPU_SECONDS", "5"))
+RESUME_PARSE_MEMORY_MB = int(os.getenv("RESUME_PARSE_MEMORY_MB", "1024"))
+RESUME_PARSE_TIMEOUT_SECONDS = float(os.getenv("RESUME_PARSE_TIMEOUT_SECONDS", "10"))
+RESUME_PARSE_TASKS_PER_CHILD = int(os.getenv("RESUME_PARSE_TASKS_PER_CHILD", "50"))
+
+
+# OCR fallback for scanned resumes. Pages are rendered and read by Tesseract
+# (through PyMuPDF) in a pool of their own, so slow OCR never competes with
+# or breaks ordinary parses. The whole fallback has a latency budget and its
+# output is cached by file hash.
+RESUME_OCR_ENABLED = os.getenv("RESUME_OCR_ENABLED", "true").lower() == "true"
+RESUME_OCR_WORKERS = int(os.getenv("RESUME_OCR_WORKERS", "2"))
+RESUME_OCR_MIN_CHARS = int(os.getenv("RESUME_OCR_MIN_CHARS", "50"))
+RESUME_OCR_MAX_PAGES = int(os.getenv("RESUME_OCR_MAX_PAGES", "4"))
+RESUME_OCR_CPU_SECONDS = int(os.getenv("RESUME_OCR_CPU_SECONDS", "15"))
+RESUME_OCR_PAGE_TIMEOUT_SECONDS = float(
+    os.getenv("RESUME_OCR_PAGE_TIMEOUT_SECONDS", "30")
+)
+RESUME_OCR_BUDGET_SECONDS = float(os.getenv("RESUME_OCR_BUDGET_SECONDS", "20"))
+RESUME_OCR_CACHE_TTL_SECONDS = int(
+    os.getenv("RESUME_OCR_CACHE_TTL_SECONDS", str(30 * 24 * 60 * 60))
+)
+
+
+class ResumeParseError(Exception):
+    """The resume could not be parsed within the sandbox limits."""
+
+
+@lru_cache(maxsize=None)
+def get_s3_client():
+    # boto3 clients are thread-safe; one per process keeps connections pooled.
+    return boto3.client(
+        "s3",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_ACCESS_SECRET_KEY"),
+        region_name=os.getenv("AWS_ACCESS_REGION"),
+        # Points at an S3-compatible server (e.g. MinIO) for local development.
+        endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+    )
+
+
+async def store_resume(filename: str, data: bytes, content_type: str = None):
+    """Upload resume bytes to S3 without blocking the event loop."""
+    extra = {"ContentType": content_type} if content_type else {}
+    await asyncio.to_thread(
+        get_s3_client().put_object,
+        Bucket=RESUME_BUCKET,
+        Key=filename,
+        Body=data,
+        **extra,
+    )
+
+
+def resume_upload_prefix(user_id) -> str:
+    """Keys a user may complete an upload for all start with this prefix."""
+    return f"{RESUME_UPLOAD_PREFIX}{user_id}/"
+
+
+def presign_resume_upload(key: str, content_type: str) -> dict:
+    """Presigned POST form for uploading one resume directly to the bucket.
+
+    A POST policy rather than a presigned PUT, because only the policy can
+    make S3 enforce the size range and the content type.
+    """
+    return get_s3_client().generate_presigned_post(
+        Bucket=RESUME_BUCKET,
+        Key=key,
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, common_utils.RESUME_MAX_BYTES],
+        ],
+        ExpiresIn=RESUME_PRESIGN_EXPIRES_SECONDS,
+    )
+
+
+async def fetch_uploaded_resume(key: str) -> Optional[bytes]:
+    """Read back a directly uploaded resume after checking its metadata.
+
+    Returns None if nothing was uploaded under ``key``. The size and content
+    type are checked with a HEAD request before the body is downloaded.
+    """
+    s3 = get_s3_client()
+    try:
+        head = await asyncio.to_thread(s3.head_object, Bucket=RESUME_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+            return None
+        raise
+    size = head["ContentLength"]
+    if size > common_utils.RESUME_MAX_BYTES:
+        raise common_utils.ResumeTooLarge(
+            f"Resume is {size} bytes, limit is {common_utils.RESUME_MAX_BYTES}"
+        )
+    if head.get("ContentType") not in RESUME_UPLOAD_CONTENT_TYPES:
+        raise ResumeParseError(f"Unsupported content type {head.get('ContentType')}")
+
+    obj = await asyncio.to_thread(s3.get_object, Bucket=RESUME_BUCKET, Key=key)
+    return await asyncio.to_thread(obj["Body"].read)
+
+
+async def delete_resume(key: str):
+    try:
+        await asyncio.to_thread(
+            get_s3_client().delete_object, Bucket=RESUME_BUCKET, Key=key
+        )
+    except Exception as e:
+        logging.warning(f"Could not delete resume {key}: {e}")
+
+
+class SandboxPool:
+    """Process pool for untrusted document parsing.
+
+    Workers cap their address space at start-up and every task runs under
+    ``common_utils.run_with_limits``, so a task over its CPU or wall-clock
+    limit kills only its own worker. That still breaks the shared pool and
+    fails every task in it, so those tasks are retried one at a time in a
+    single-worker pool of their own: the innocent ones succeed and a
+    repeat offender can only fail itself.
+    """
+
+    def __init__(self, workers: int, memory_mb: int, tasks_per_child: int):
+        self.workers = max(1, workers)
+        self.memory_bytes = memory_mb * 1024 * 1024
+        self.tasks_per_child = tasks_per_child
+        self._pool = None
+        self._isolated = None
+
+    def _new_pool(self, workers: int) -> ProcessPoolExecutor:
+        # spawn: forking a process that holds Mongo client threads is unsafe.
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=common_utils.limit_parser_memory,
+            initargs=(self.memory_bytes,),
+            max_tasks_per_child=self.tasks_per_child,
+        )
+
+    def _shared_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = self._new_pool(self.workers)
+        return self._pool
+
+    def _discard(self, pool: ProcessPoolExecutor):
+        if self._pool is pool:
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _submit(self, pool, cpu_seconds, wall_seconds, fn, args):
+        future = pool.submit(
+            common_utils.run_with_limits, cpu_seconds, wall_seconds, fn, *args
+        )
+        try:
+            return await asyncio.wrap_future(future)
+        except MemoryError:
+            raise ResumeParseError("Resume parsing ran out of memory")
+
+    async def run(self, fn, *args, cpu_seconds: int, wall_seconds: float):
+        """Run ``fn(*args)`` in the pool; limit violations raise ResumeParseError."""
+        pool = self._shared_pool()
+        try:
+            return await self._submit(pool, cpu_seconds, wall_seconds, fn, args)
+        except BrokenProcessPool:
+            self._discard(pool)
+            logging.warning("Resume parser pool broke, retrying the task alone")
+
+        if self._isolated is None:
+            self._isolated = asyncio.Semaphore(self.workers)
+        async with self._isolated:
+            pool = self._new_pool(1)
+            try:
+                return await self._submit(pool, cpu_seconds, wall_seconds, fn, args)
+            except BrokenProcessPool:
+                raise ResumeParseError("Resume parsing exceeded its CPU or time limit")
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+
+parser_pool = SandboxPool(
+    RESUME_PARSE_WORKERS, RESUME_PARSE_MEMORY_MB, RESUME_PARSE_TASKS_PER_CHILD
+)
+ocr_pool = SandboxPool(
+    RESUME_OCR_WORKERS, RESUME_PARSE_MEMORY_MB, RESUME_PARSE_TASKS_PER_CHILD
+)
+
+
+async def parse_resume(data: bytes) -> str:
+    """Extract resume text in the sandboxed parser pool.
+
+    Raises ResumeTooLarge for oversized files and ResumeParseError when the
+    parse runs out of memory, CPU time or wall-clock time.
+    """
+    return await parser_pool.run(
+        common_utils.extract_pdf_text,
+        data,
+        cpu_seconds=RESUME_PARSE_CPU_SECONDS,
+        wall_seconds=RESUME_PARSE_TIMEOUT_SECONDS,
+    )
+
+
+async def _ocr_pages(data: bytes) -> dict:
+    """OCR the first pages of ``data`` in parallel, in page order.
+
+    Every page is queued on the OCR pool at once. Results are consumed in
+    page order and the pages still queued are cancelled as soon as the
+    character limit is reached, the document runs out of pages or the
+    latency budget is spent; whatever text was read by then is returned.
+    Running pages are left to finish rather than killed, so the budget
+    never takes down a worker; only a page over its own limits does.
+
+    ``complete`` is False when the budget or a failing page cut the text
+    short, so a later attempt may read more.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + RESUME_OCR_BUDGET_SECONDS
+
+    async def ocr_page(page_number: int):
+        return await ocr_pool.run(
+            common_utils.ocr_pdf_page,
+            data,
+            page_number,
+            cpu_seconds=RESUME_OCR_CPU_SECONDS,
+            wall_seconds=RESUME_OCR_PAGE_TIMEOUT_SECONDS,
+        )
+
+    tasks = [
+        asyncio.ensure_future(ocr_page(page_number))
+        for page_number in range(RESUME_OCR_MAX_PAGES)
+    ]
+    parts = []
+    collected = 0
+    complete = True
+    try:
+        for page_number, task in enumerate(tasks):
+            try:
+                text = await asyncio.wait_for(task, max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                logging.warning(f"OCR budget spent at page {page_number}")
+                complete = False
+                break
+            except ResumeParseError as e:
+                logging.warning(f"OCR stopped at page {page_number}: {e}")
+                complete = False
+                break
+            if text is None:
+                break
+            parts.append(text)
+            collected += len(text)
+            if collected >= common_utils.RESUME_CHAR_LIMIT:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+    return {
+        "text": "".join(parts)[: common_utils.RESUME_CHAR_LIMIT],
+        "complete": complete,
+    }
+
+
+async def ocr_resume(data: bytes) -> str:
+    """OCR text of a scanned resume, cached in Redis by the file's hash.
+
+    Only complete results are cached, so a file whose OCR was cut short is
+    read again next time. Without a usable Redis the OCR runs uncached.
+    """
+    key = f"resume_ocr:{hashlib.sha256(data).hexdigest()}"
+    redis_uri = os.getenv("REDIS_URI")
+    try:
+        redis = redis_asyncio.from_url(redis_uri, decode_responses=True)
+    except ValueError as e:
+        logging.warning(f"Redis not configured ({e}), running OCR uncached")
+        return (await _ocr_pages(data))["text"]
+    try:
+        result = await cache_utils.get_or_compute(
+            redis,
+            key,
+            lambda: _ocr_pages(data),
+            RESUME_OCR_CACHE_TTL_SECONDS,
+            should_cache=lambda result: result.get("complete", False),
+        )
+    finally:
+        await redis.close()
+    return result["text"]
+
+
+async def extract_resume_text(data: bytes) -> str:
+    """Sandboxed resume text extraction.
+
+    PDFs with (almost) no text layer are scanned images; their text comes
+    from the OCR fallback instead. ResumeTooLarge and ResumeParseError
+    propagate; any other parse error is logged and yields an empty string.
+    """
+    try:
+        resume_text = await parse_resume(data)
+    except (common_utils.ResumeTooLarge, ResumeParseError):
+        raise
+    except Exception as e:
+        logging.error(f"Error extracting resume text: {e}")
+        return ""
+
+    if not RESUME_OCR_ENABLED or len(resume_text.strip()) >= RESUME_OCR_MIN_CHARS:
+        return resume_text
+    try:
+        ocr_text = await ocr_resume(data)
+        logging.info(f"Resume has no text layer, OCR read {len(ocr_text)} chars")
+        return ocr_text or resume_text
+    except Exception as e:
+        logging.error(f"Error running OCR on resume: {e}")
+        return resume_text
+
+
+async def extract_resume_text_from_s3(filename: str) -> str:
+    data = await asyncio.to_thread(
+        common_utils.download_resume, RESUME_URL.format(filename)
+    )
+    return await extract_resume_text(data)
+
+
+# Profiles being generated in this worker, shared by identical resumes.
+_profiles_inflight: Dict[str, asyncio.Task] = {}
+
+SKILL_FIELDS = ("skills", "tools", "domains")
+SKILL_MAX_TERMS = 30
+SKILL_MAX_TERM_LENGTH = 50
+
+# Common spellings mapped to one term so searches match across resumes.
+SKILL_ALIASES = {
+    "js": "javascript",
+    "ts": "typescript",
+    "py": "python",
+    "golang": "go",
+    "k8s": "kubernetes",
+    "postgres": "postgresql",
+    "mongo": "mongodb",
+    "node": "node.js",
+    "nodejs": "node.js",
+    "reactjs": "react",
+    "react.js": "react",
+    "vuejs": "vue",
+    "vue.js": "vue",
+    "ml": "machine learning",
+    "ai": "artificial intelligence",
+    "amazon web services": "aws",
+    "google cloud platform": "gcp",
+    "google cloud": "gcp",
+}
+
+
+def normalize_term(term: str) -> str:
+    term = " ".join(str(term).lower().split()).strip(" .,;")
+    return SKILL_ALIASES.get(term, term)
+
+
+def normalize_terms(terms) -> List[str]:
+    """Lowercase, de-alias and de-duplicate terms, keeping their order."""
+    if not isinstance(terms, list):
+        return []
+    normalized = []
+    for term in terms:
+        term = normalize_term(term)
+        if term and len(term) <= SKILL_MAX_TERM_LENGTH and term not in normalized:
+            normalized.append(term)
+    return normalized[:SKILL_MAX_TERMS]
+
+
+def resume_text_hash(resume_text: str) -> str:
+    """Content hash of extracted resume text, insensitive to whitespace."""
+    normalized = " ".join(resume_text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+async def _build_and_store(
+    content_hash: str, resume_text: str, record: Optional[ResumeSummary]
+) -> dict:
+    update = {}
+    resume_summary = None
+    if (
+        record
+        and record.summary
+        and record.prompt_version == openai_utils.RESUME_SUMMARY_PROMPT_VERSION
+    ):
+        resume_summary = record.summary
+    else:
+        resume_summary = await asyncio.to_thread(
+            openai_utils.summarize_resume, resume_text
+        )
+        if not resume_summary:
+            # summarize_resume returns "" on failure; leave it uncached.
+            return {"resume_summary": resume_summary}
+        update["summary"] = resume_summary
+        update["prompt_version"] = openai_utils.RESUME_SUMMARY_PROMPT_VERSION
+
+    extracted = await asyncio.to_thread(
+        openai_utils.extract_resume_skills, resume_summary
+    )
+    profile = {"resume_summary": resume_summary}
+    if extracted:
+        # On failure the skill fields are left out, so they stay unset on
+        # the user and the backfill picks them up later.
+        for field in SKILL_FIELDS:
+            profile[field] = normalize_terms(extracted.get(field))
+        update.update({field: profile[field] for field in SKILL_FIELDS})
+        update["skills_version"] = openai_utils.RESUME_SKILLS_PROMPT_VERSION
+
+    if update:
+        now = datetime.utcnow()
+        update["updated_at"] = now
+        try:
+            await ResumeSummary.get_motor_collection().update_one(
+                {"content_hash": content_hash},
+                {"$set": update, "$setOnInsert": {"created_at": now}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # Another worker inserted the same hash first; its result is as good.
+            pass
+    return profile
+
+
+async def get_resume_profile(resume_text: str) -> dict:
+    """Summary and skill index for ``resume_text``, as User fields.
+
+    Returns ``resume_summary``, ``skills``, ``tools`` and ``domains``,
+    reusing what is stored for the same text. Parts written with an older
+    prompt version are regenerated and replaced.
+    """
+    if not resume_text or not resume_text.strip():
+        return {"resume_summary": ""}
+    content_hash = resume_text_hash(resume_text)
+    record = await ResumeSummary.find_one(ResumeSummary.content_hash == content_hash)
+    if (
+        record
+        and record.summary
+        and record.prompt_version == openai_utils.RESUME_SUMMARY_PROMPT_VERSION
+        and record.skills_version == openai_utils.RESUME_SKILLS_PROMPT_VERSION
+    ):
+        logging.info(f"Reusing stored resume summary {content_hash[:12]}")
+        profile = {"resume_summary": record.summary}
+        profile.update({field: getattr(record, field) or [] for field in SKILL_FIELDS})
+        return profile
+
+    task = _profiles_inflight.get(content_hash)
+    if task is None:
+        task = asyncio.ensure_future(
+            _build_and_store(content_hash, resume_text, record)
+        )
+        _profiles_inflight[content_hash] = task
+        task.add_done_callback(lambda _: _profiles_inflight.pop(content_hash, None))
+    return await asyncio.shield(task)
+
+
+async def summarize_resume_for_user(user_id: ObjectId, filename: str, resume_text: str):
+    """Summarize a resume and attach the summary and skills to the user.
+
+    Runs after the upload response is sent. The result is only written if
+    the user still has this resume, so a slow summary of an older upload
+    cannot replace the current one's.
+    """
+    try:
+        profile = await get_resume_profile(resume_text)
+        await User.get_motor_collection().update_one(
+            {"_id": user_id, "resume": filename},
+            {"$set": profile},
+        )
+        auth.invalidate_user(user_id)
+        logging.info(f"Resume {filename} summarized successfully.")
+    except Exception:
+        logging.exception(f"Error summarizing resume {filename}")
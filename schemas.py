@@ -43,6 +43,8 @@ class InterviewCreateOut(BaseModel):
 class InterviewQuestionsOut(BaseModel):
     questions: List
     interview_id: str
+    greeting: Optional[str] = None
+    greeting_audio_url: Optional[str] = None
 
 
 class Message(BaseModel):
@@ -144,3 +146,12 @@ class Employee(BaseModel):
 class LoginEmployee(BaseModel):
     email: str
     password: str
+
+
+class ResumeUploadRequest(BaseModel):
+    filename: str
+    content_type: str = "application/pdf"
+
+
+class ResumeUploadComplete(BaseModel):
+    key: str
@@ -184,12 +184,8 @@ async def get_30_question_quiz(
 @router.post("/submit", response_model=dict)
 async def submit_quiz_result(
     quiz_data: schemas.QuizSubmissionRequest,
-    current_user: str = Depends(auth.get_current_user),
+    user: User = Depends(auth.get_current_user_doc),
 ):
-    user = await User.find_one(User.email == current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     # Extract submitted answers and topics
     answers = quiz_data.answers
     topics = quiz_data.topics
@@ -279,11 +275,7 @@ async def submit_quiz_result(
 
 
 @router.get("/scores", response_model=List[UserAptitude])
-async def get_user_quiz_responses(current_user: str = Depends(auth.get_current_user)):
-
-    user = await User.find_one(User.email == current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+async def get_user_quiz_responses(user: User = Depends(auth.get_current_user_doc)):
 
     # Fetch all quiz responses for the user
     quiz_responses = await UserAptitude.find(
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, Query, status, Depends
 from fastapi.responses import JSONResponse
-from typing import List
+from typing import List, Optional
 import auth
 from models.employee import Employee
 import logging
@@ -9,6 +9,7 @@ from models.company import Company
 from models.users import User
 from bson import ObjectId
 import schemas
+import resume_utils
 
 router = APIRouter()
 
@@ -156,6 +157,92 @@ async def get_interviews(current_user: str = Depends(auth.get_current_user)):
     return JSONResponse(status_code=status.HTTP_200_OK, content=enhanced_interviews)
 
 
+CANDIDATE_SEARCH_MAX_LIMIT = 200
+
+
+async def get_employee_company(current_user: str) -> Optional[Company]:
+    """The company an employee belongs to; None for the support account."""
+    if current_user == "support@mockai.tech":
+        return None
+    employee = await Employee.find_one(Employee.email == current_user)
+    if not employee:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Employee not found"
+        )
+    company = await Company.find_one(Company.name == employee.company_name)
+    if not company:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Company not found"
+        )
+    return company
+
+
+@router.get("/candidates")
+async def search_candidates(
+    skills: List[str] = Query([]),
+    tools: List[str] = Query([]),
+    domains: List[str] = Query([]),
+    match: str = Query("all", pattern="^(all|any)$"),
+    limit: int = Query(50, ge=1, le=CANDIDATE_SEARCH_MAX_LIMIT),
+    skip: int = Query(0, ge=0),
+    current_user: str = Depends(auth.get_current_user),
+):
+    """Filter the company's candidates by skills, tools and domains.
+
+    Terms are normalized the same way as the extracted ones. ``match=all``
+    requires every term in a field, ``match=any`` at least one. Queries are
+    answered from the multikey indexes on the user skill fields.
+    """
+    terms = {
+        "skills": resume_utils.normalize_terms(skills),
+        "tools": resume_utils.normalize_terms(tools),
+        "domains": resume_utils.normalize_terms(domains),
+    }
+    if not any(terms.values()):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide at least one skill, tool or domain",
+        )
+
+    operator = "$all" if match == "all" else "$in"
+    query = {field: {operator: values} for field, values in terms.items() if values}
+    company = await get_employee_company(current_user)
+    if company:
+        query["organization.$id"] = company.id
+
+    projection = {
+        "name": 1,
+        "email": 1,
+        "job_role": 1,
+        "years_of_experience": 1,
+        "resume": 1,
+        "skills": 1,
+        "tools": 1,
+        "domains": 1,
+    }
+    users = (
+        await User.get_motor_collection()
+        .find(query, projection)
+        .sort("_id", -1)
+        .skip(skip)
+        .limit(limit)
+        .to_list(length=limit)
+    )
+
+    candidates = []
+    for user in users:
+        user_id = user.pop("_id")
+        resume = user.pop("resume", None)
+        candidates.append(
+            {
+                "id": str(user_id),
+                **user,
+                "resume": User.model_construct(resume=resume).resume_url(),
+            }
+        )
+    return JSONResponse(status_code=status.HTTP_200_OK, content=candidates)
+
+
 @router.put("/company/{company_id}/employees")
 async def add_employees_to_company(company_id: str, payload):
 
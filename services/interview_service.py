@@ -1,10 +1,20 @@
-from fastapi import Depends, HTTPException, APIRouter, Query, File, UploadFile, Request
-from fastapi.responses import JSONResponse, StreamingResponse
-import httpx
+from fastapi import (
+    Depends,
+    HTTPException,
+    APIRouter,
+    Query,
+    File,
+    Form,
+    UploadFile,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from models.interview import (
     Interview,
     QuestionResponse,
-    SpeechAnalysis,
     CustomerFeedback,
     FreeReview,
     PaidReview,
@@ -16,25 +26,31 @@ import schemas, auth
 import openai_utils
 import json
 import logging
+import asyncio
 from datetime import datetime
+from typing import List
 from bson import ObjectId
 import openai
 import io
+import re
 import os
 import razorpay
-from google.cloud import texttospeech, storage
-import librosa
+import redis.asyncio as redis_asyncio
 from dotenv import load_dotenv
 import common_utils
+import asr_utils
+import cache_utils
+import upload_utils
+import transcription_utils
+import tts_utils
+import resume_utils
+import audio_utils
 import hmac
 import hashlib
 
 load_dotenv()
 
 router = APIRouter()
-client = texttospeech.TextToSpeechClient()
-storage_client = storage.Client()
-BUCKET_NAME = "mockai-resume"
 razorpay_client = razorpay.Client(
     auth=(os.getenv("RAZORPAY_KEY_ID"), os.getenv("RAZORPAY_KEY_SECRET"))
 )
@@ -44,14 +60,9 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 
 @router.post("/create_interview", response_model=schemas.InterviewCreateOut)
 async def create_interview(
-    current_user: str = Depends(auth.get_current_user),
+    db_user: User = Depends(auth.get_current_user_doc),
     aptitude_id: str = Query(None),
 ):
-    # 1) Fetch user doc via Beanie
-    db_user = await User.find_one(User.email == current_user)
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found.")
-
     linked_aptitude = None
     if aptitude_id:
         try:
@@ -94,14 +105,54 @@ async def create_interview(
     )
 
 
+def speech_audio_url(text: str, fmt: tts_utils.TTSFormat) -> str:
+    url = f"/interview/audio/{tts_utils.tts_cache_key(text, fmt=fmt)}"
+    if fmt != tts_utils.DEFAULT_TTS_FORMAT:
+        url += f"?format={fmt.name}"
+    return url
+
+
+async def questions_with_audio(
+    redis: redis_asyncio.Redis,
+    greeting: str,
+    question_responses: list,
+    content: dict,
+    fmt: tts_utils.TTSFormat = tts_utils.DEFAULT_TTS_FORMAT,
+) -> dict:
+    """Build the generate_questions payload and start synthesizing its audio.
+
+    Every question (and the greeting) gets an ``audio_url`` that is filled in
+    the background, so playback does not wait on TTS question by question.
+    The texts are recorded so the URLs keep working after the clips have
+    been evicted or on another pod.
+    """
+    texts = [greeting] + [q.question for q in question_responses]
+    await tts_utils.remember_texts(redis, texts, fmt)
+    tts_utils.schedule_presynthesis(texts, fmt=fmt)
+    questions = []
+    for q in question_responses:
+        question = q.dict()
+        question["audio_url"] = speech_audio_url(q.question, fmt)
+        questions.append(question)
+    return {
+        "questions": questions,
+        "greeting": greeting,
+        "greeting_audio_url": speech_audio_url(greeting, fmt) if greeting else None,
+        **content,
+    }
+
+
 @router.post("/generate_questions", response_model=schemas.InterviewQuestionsOut)
 async def generate_questions(
+    request: Request,
     interview_id: str = Query(...),
-    current_user: str = Depends(auth.get_current_user),
+    audio_format: str = Query(None, alias="format"),
+    db_user: User = Depends(auth.get_current_user_doc),
+    redis: redis_asyncio.Redis = Depends(cache_utils.get_redis),
 ):
-    db_user = await User.find_one(User.email == current_user)
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found.")
+    fmt = tts_utils.negotiate_format(
+        audio_format, save_data=request.headers.get("save-data") == "on"
+    )
 
     try:
         interview_obj_id = ObjectId(interview_id)
@@ -119,11 +170,16 @@ async def generate_questions(
     # Return existing questions if already generated
     if interview_doc.question_responses and len(interview_doc.question_responses) > 0:
         return JSONResponse(
-            content={
-                "questions": [q.dict() for q in interview_doc.question_responses],
-                "interview_id": str(interview_doc.id),
-                "completion_percentage": interview_doc.completion_percentage,
-            }
+            content=await questions_with_audio(
+                redis,
+                interview_doc.greeting,
+                interview_doc.question_responses,
+                {
+                    "interview_id": str(interview_doc.id),
+                    "completion_percentage": interview_doc.completion_percentage,
+                },
+                fmt,
+            )
         )
 
     previous_interview = (
@@ -178,17 +234,17 @@ async def generate_questions(
                 else:
                     logging.info("Extracting resume summary from S3")
                     try:
-                        bucket_name = "mockai-resume"
-                        resume_url = (
-                            f"https://{bucket_name}.s3.amazonaws.com/{db_user.resume}"
+                        resume_text = await resume_utils.extract_resume_text_from_s3(
+                            db_user.resume
                         )
-                        logging.info(f"Resume URL: {resume_url}")
-                        resume_text = common_utils.extract_resume_text_from_s3_url(
-                            resume_url
+                        profile = await resume_utils.get_resume_profile(resume_text)
+                        resume_summary = profile["resume_summary"]
+                        # Targeted update: db_user may be a cached copy.
+                        await User.get_motor_collection().update_one(
+                            {"_id": db_user.id, "resume": db_user.resume},
+                            {"$set": profile},
                         )
-                        resume_summary = openai_utils.summarize_resume(resume_text)
-                        db_user.resume_summary = resume_summary
-                        await db_user.save()
+                        auth.invalidate_user(db_user.id)
                     except Exception as e:
                         logging.warning(f"Error processing resume: {e}")
                         resume_summary = "Resume not available"
@@ -246,28 +302,26 @@ async def generate_questions(
     question_responses = [QuestionResponse(question=q) for q in question_list]
 
     interview_doc.question_responses = question_responses
+    interview_doc.greeting = parsed.get("greeting")
     interview_doc.generation_type = "detailed" if use_detailed_generation else "simple"
     await interview_doc.save()
 
     return JSONResponse(
-        content={
-            "questions": [q.dict() for q in question_responses],
-            "interview_id": str(interview_doc.id),
-            "completion_percentage": 0,
-        }
+        content=await questions_with_audio(
+            redis,
+            interview_doc.greeting,
+            question_responses,
+            {"interview_id": str(interview_doc.id), "completion_percentage": 0},
+            fmt,
+        )
     )
 
 
 @router.post("/submit_interview")
 async def interview_convo(
     interview_id: str = Query(...),
-    current_user: str = Depends(auth.get_current_user),
+    db_user: User = Depends(auth.get_current_user_doc),
 ):
-    # get thread_id and assistant_id from db
-    db_user = await User.find_one(User.email == current_user)
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found.")
-
     try:
         interview_obj_id = ObjectId(interview_id)
     except Exception as e:
@@ -287,6 +341,21 @@ async def interview_convo(
                 "completion_percentage": interview_doc.completion_percentage,
             }
         )
+
+    # Only answers whose background analysis is still outstanding are waited on
+    pending_question_ids = [
+        qa.question_id
+        for qa in interview_doc.question_responses
+        if qa.speech_analysis is not None
+        and qa.speech_analysis.analysis_status
+        in (transcription_utils.ANALYSIS_PENDING, transcription_utils.ANALYSIS_FAILED)
+    ]
+    if pending_question_ids:
+        await transcription_utils.wait_for_answer_analyses(
+            interview_obj_id, pending_question_ids
+        )
+        interview_doc = await Interview.get(interview_obj_id)
+
     responses_list = []
     for qa in interview_doc.question_responses:
         combined = {"question_id": qa.question_id, "question": qa.question}
@@ -360,12 +429,8 @@ async def interview_convo(
 
 @router.get("/paid")
 async def interview_feedback(
-    interview_id: str = Query(...), current_user: str = Depends(auth.get_current_user)
+    interview_id: str = Query(...), db_user: User = Depends(auth.get_current_user_doc)
 ):
-    db_user = await User.find_one(User.email == current_user)
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found.")
-
     try:
         interview_obj_id = ObjectId(interview_id)
     except Exception as e:
@@ -596,15 +661,13 @@ async def transcribe_audio(
     interview_id: str = Query(...),
     completion_percentage: str = Query(...),
     audio: UploadFile = File(...),
-    current_user: str = Depends(auth.get_current_user),
+    db_user: User = Depends(auth.get_current_user_doc),
+    redis: redis_asyncio.Redis = Depends(cache_utils.get_redis),
 ):
     logging.info(
         f"Transcribe request received - interview_id: {interview_id}, question_id: {question_id}"
     )
     try:
-        db_user = await User.find_one(User.email == current_user)
-        if not db_user:
-            raise HTTPException(status_code=404, detail="User not found.")
 
         try:
             interview_obj_id = ObjectId(interview_id)
@@ -613,166 +676,554 @@ async def transcribe_audio(
                 status_code=400, detail=f"Invalid interview_id: {str(e)}"
             )
 
-        interview_doc = await Interview.get(interview_obj_id)
-        if not interview_doc:
-            raise HTTPException(status_code=404, detail="Interview not found.")
+        # Only the targeted question is loaded, not every transcript and review
+        question_text = await transcription_utils.get_question_text(
+            interview_obj_id, question_id, db_user.id
+        )
 
         # Read audio
         audio_bytes = await audio.read()
         if len(audio_bytes) == 0:
             raise HTTPException(status_code=400, detail="Empty audio file received")
 
-        audio_file = io.BytesIO(audio_bytes)
+        # Retries of the same recording reuse the stored result, and concurrent
+        # duplicates share one ASR + analysis run.
+        result = await cache_utils.get_or_compute(
+            redis,
+            cache_utils.transcription_cache_key(audio_bytes, question_id),
+            lambda: transcription_utils.process_answer_audio(
+                interview_obj_id,
+                question_id,
+                question_text,
+                audio_bytes,
+                int(completion_percentage),
+                content_type=audio.content_type,
+            ),
+        )
+        result = await transcription_utils.with_analysis_status(
+            interview_obj_id, question_id, result
+        )
 
-        # Extract audio duration
-        try:
-            audio_data, sample_rate = librosa.load(io.BytesIO(audio_bytes), sr=None)
-            duration_seconds = librosa.get_duration(y=audio_data, sr=sample_rate)
-        except Exception as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Could not decode audio. Ensure valid format. Error: {str(e)}",
-            )
+        return JSONResponse(content=result)
 
-        # Transcribe audio
-        audio_file.seek(0)
-        try:
-            url = "https://api.openai.com/v1/audio/transcriptions"
-            headers = {"Authorization": f"Bearer {openai.api_key}"}
-            data = {"model": "whisper-1"}
-            files = {"file": ("recording.wav", audio_file, "audio/wav")}
-
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    url, headers=headers, data=data, files=files
-                )
-
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"OpenAI API error: {response.text}",
-                )
-
-            response_json = response.json()
-        except httpx.TimeoutException:
-            raise HTTPException(status_code=504, detail="OpenAI API request timed out")
-        except httpx.RequestError as e:
-            raise HTTPException(
-                status_code=502, detail=f"OpenAI API request failed: {str(e)}"
-            )
-        except Exception as e:
-            raise HTTPException(
-                status_code=400, detail=f"OpenAI Whisper error: {str(e)}"
-            )
+    except HTTPException:
+        raise
 
-        transcript_text = response_json.get("text", "").strip()
-        if not transcript_text:
-            logging.warning("Empty transcript returned from OpenAI Whisper")
+    except Exception as e:
+        logging.error(f"Unhandled exception in transcribe endpoint: {str(e)}")
+        import traceback
 
-        # Find question text
-        question_text = None
-        if interview_doc.question_responses:
-            for qr in interview_doc.question_responses:
-                if qr.question_id == question_id:
-                    question_text = qr.question
-                    break
+        logging.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+
+@router.post("/transcribe/batch")
+async def transcribe_audio_batch(
+    interview_id: str = Query(...),
+    completion_percentage: str = Query(...),
+    question_ids: List[str] = Form(...),
+    audio: List[UploadFile] = File(...),
+    db_user: User = Depends(auth.get_current_user_doc),
+):
+    """Transcribe several recorded answers in one request.
+
+    Send one ``question_ids`` field and one ``audio`` file per answer, in the
+    same order. Each answer gets its own entry in ``results``; one that
+    cannot be decoded carries an ``error`` instead of a transcript.
+    """
+    if len(question_ids) != len(audio):
+        raise HTTPException(
+            status_code=400, detail="Expected one audio file per question_id"
+        )
+    if len(set(question_ids)) != len(question_ids):
+        raise HTTPException(status_code=400, detail="Duplicate question_id in batch")
+    if len(question_ids) > transcription_utils.BATCH_TRANSCRIBE_MAX_PARTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {transcription_utils.BATCH_TRANSCRIBE_MAX_PARTS} answers per batch",
+        )
+
+    try:
+        interview_obj_id = ObjectId(interview_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid interview_id: {str(e)}")
 
-        if not question_text:
+    question_texts = await transcription_utils.get_question_texts(
+        interview_obj_id, question_ids, db_user.id
+    )
+
+    answers = []
+    for question_id, upload in zip(question_ids, audio):
+        audio_bytes = await upload.read()
+        if len(audio_bytes) == 0:
             raise HTTPException(
-                status_code=404, detail="question_id not found in interview"
+                status_code=400, detail=f"Empty audio file received for {question_id}"
+            )
+        answers.append(
+            (
+                question_id,
+                question_texts[question_id],
+                audio_bytes,
+                upload.content_type,
             )
-        speech_metrics = openai_utils.analyze_audio(
-            question_text=question_text,
-            transcript_text=transcript_text,
-            duration_seconds=duration_seconds,
         )
 
-        # Parse the JSON response from speech_metrics
-        try:
-            metrics_dict = json.loads(speech_metrics["text"])
-            logging.info("Parsed metrics dict: %s", metrics_dict)
-        except (json.JSONDecodeError, KeyError) as e:
-            logging.error("Error parsing speech metrics: %s", e)
-            metrics_dict = {}
-
-        # Update question response
-        for qr in interview_doc.question_responses:
-            if qr.question_id == question_id:
-                qr.speech_analysis = SpeechAnalysis(
-                    transcript=transcript_text,
-                    fluency_score=metrics_dict.get("fluency_score", 0.0),
-                    confidence_score=metrics_dict.get("confidence_score", 0.0),
-                    clarity_score=metrics_dict.get("clarity_score", 0.0),
-                    words_per_minute=metrics_dict.get("words_per_minute", 0.0),
-                    filler_words=metrics_dict.get("filler_words_used", []),
-                    time_seconds=duration_seconds,
-                    answer_relevance_score=metrics_dict.get(
-                        "answer_relevance_score", 0.0
-                    ),
-                )
-                break
-
-        interview_doc.completion_percentage = int(completion_percentage)
-        await interview_doc.save()
+    try:
+        results = await transcription_utils.process_answer_batch(
+            interview_obj_id, answers, int(completion_percentage)
+        )
+    except Exception as e:
+        logging.exception("Error in batch transcription")
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+    return JSONResponse(content={"results": results})
+
+
+def get_owned_upload(upload_id: str, current_user: str) -> upload_utils.UploadSession:
+    session = upload_utils.load_session(upload_id)
+    if not session or session.user_email != current_user:
+        raise HTTPException(status_code=404, detail="Upload not found.")
+    return session
+
+
+@router.post("/uploads", status_code=201)
+async def create_answer_upload(
+    question_id: str = Query(...),
+    interview_id: str = Query(...),
+    total_size: int = Query(None),
+    content_type: str = Query(None),
+    db_user: User = Depends(auth.get_current_user_doc),
+):
+    try:
+        interview_obj_id = ObjectId(interview_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail="Invalid interview_id") from e
+
+    await transcription_utils.get_question_text(
+        interview_obj_id, question_id, db_user.id
+    )
+
+    if total_size is not None and total_size > upload_utils.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Audio file too large.")
+
+    session = upload_utils.create_session(
+        db_user.email, interview_id, question_id, total_size, content_type
+    )
+    return JSONResponse(
+        status_code=201,
+        content={
+            "upload_id": session.upload_id,
+            "offset": 0,
+            "max_bytes": upload_utils.UPLOAD_MAX_BYTES,
+        },
+    )
+
 
+@router.get("/uploads/{upload_id}")
+async def get_answer_upload(
+    upload_id: str, current_user: str = Depends(auth.get_current_user)
+):
+    session = get_owned_upload(upload_id, current_user)
+    return {
+        "upload_id": session.upload_id,
+        "offset": session.offset,
+        "total_size": session.total_size,
+        "decoded_seconds": session.decoded_seconds,
+        "finalized": session.finalized,
+    }
+
+
+@router.patch("/uploads/{upload_id}")
+async def upload_answer_chunk(
+    upload_id: str,
+    request: Request,
+    current_user: str = Depends(auth.get_current_user),
+):
+    session = get_owned_upload(upload_id, current_user)
+    if session.finalized:
+        raise HTTPException(status_code=409, detail="Upload already finalized.")
+
+    try:
+        offset = int(request.headers["Upload-Offset"])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Missing or invalid Upload-Offset")
+
+    chunk = await request.body()
+    if not chunk:
+        raise HTTPException(status_code=400, detail="Empty chunk received")
+    if offset + len(chunk) > upload_utils.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Audio file too large.")
+
+    try:
+        new_offset = await upload_utils.append_chunk(session, offset, chunk)
+    except upload_utils.UploadOffsetMismatch as e:
+        # The client resumes from the offset we actually have.
         return JSONResponse(
-            content={
-                "message": f"Transcription and analysis complete for question {question_id}"
-            }
+            status_code=409,
+            content={"message": "Offset mismatch.", "offset": e.current_offset},
+            headers={"Upload-Offset": str(e.current_offset)},
+        )
+    except upload_utils.UploadFinalized:
+        raise HTTPException(status_code=409, detail="Upload already finalized.")
+
+    return JSONResponse(
+        content={"upload_id": upload_id, "offset": new_offset},
+        headers={"Upload-Offset": str(new_offset)},
+    )
+
+
+@router.post("/uploads/{upload_id}/finalize")
+async def finalize_answer_upload(
+    upload_id: str,
+    completion_percentage: str = Query(...),
+    current_user: str = Depends(auth.get_current_user),
+    redis: redis_asyncio.Redis = Depends(cache_utils.get_redis),
+):
+    session = get_owned_upload(upload_id, current_user)
+    interview_obj_id = ObjectId(session.interview_id)
+    # Chunks and concurrent retries wait until this finalize is done.
+    async with upload_utils.upload_lock(session):
+        # A retried finalize gets the result of the first one.
+        result = upload_utils.load_result(session)
+        if result is None:
+            result = await finalize_upload(
+                session, interview_obj_id, int(completion_percentage), redis
+            )
+
+    result = await transcription_utils.with_analysis_status(
+        interview_obj_id, session.question_id, result
+    )
+    return JSONResponse(content=result)
+
+
+async def finalize_upload(
+    session: upload_utils.UploadSession,
+    interview_obj_id: ObjectId,
+    completion_percentage: int,
+    redis: redis_asyncio.Redis,
+) -> dict:
+    if session.offset == 0:
+        raise HTTPException(status_code=400, detail="Empty audio file received")
+    if session.total_size is not None and session.offset != session.total_size:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload incomplete: {session.offset} of {session.total_size} bytes",
         )
 
+    question_text = await transcription_utils.get_question_text(
+        interview_obj_id, session.question_id
+    )
+
+    audio_bytes, samples = await upload_utils.assemble(session)
+    try:
+        result = await cache_utils.get_or_compute(
+            redis,
+            cache_utils.transcription_cache_key(audio_bytes, session.question_id),
+            lambda: transcription_utils.process_answer_audio(
+                interview_obj_id,
+                session.question_id,
+                question_text,
+                audio_bytes,
+                completion_percentage,
+                samples=samples,
+                content_type=session.content_type,
+            ),
+        )
     except HTTPException:
         raise
+    except Exception as e:
+        logging.exception("Error finalizing chunked upload")
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
+    upload_utils.complete(session, result)
+    return result
+
+
+async def send_partial_transcript(
+    websocket: WebSocket, stream: asr_utils.StreamingTranscription
+):
+    try:
+        transcript = await stream.partial()
+        await websocket.send_json({"type": "partial", "transcript": transcript})
     except Exception as e:
-        logging.error(f"Unhandled exception in transcribe endpoint: {str(e)}")
-        import traceback
+        logging.warning(f"Partial transcription failed: {e}")
 
-        logging.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
+@router.websocket("/stream")
+async def stream_transcription(
+    websocket: WebSocket,
+    question_id: str = Query(...),
+    interview_id: str = Query(...),
+    token: str = Query(...),
+):
+    """Transcribe an answer live while the candidate is speaking.
+
+    The client sends encoded audio (MediaRecorder WebM/Opus or Ogg) as binary
+    frames, then ``{"type": "stop", "completion_percentage": N}`` when the
+    candidate finishes. The server pushes ``{"type": "partial"}`` transcripts
+    while audio arrives and one ``{"type": "final"}`` message once the
+    SpeechAnalysis has been stored. A stream longer than ``UPLOAD_MAX_BYTES``
+    or ``STREAM_MAX_SECONDS`` is closed with code 1009.
+    """
+    try:
+        db_user = await auth.get_current_user_doc(token)
+        interview_obj_id = ObjectId(interview_id)
+        question_text = await transcription_utils.get_question_text(
+            interview_obj_id, question_id, db_user.id
+        )
+    except Exception:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    stream = asr_utils.StreamingTranscription(asr_utils.get_transcriber())
+    await stream.start()
+    partial_task = None
+    recording = bytearray()
 
-@router.post("/synthesize_speech")
-async def synthesize_speech(request: schemas.TextToSpeechRequest):
     try:
-        # Set up the synthesis input
-        text = request.text
-        print(text)
-        synthesis_input = texttospeech.SynthesisInput(text=text)
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                stream.abort()
+                return
+
+            if message.get("bytes"):
+                if (
+                    len(recording) + len(message["bytes"])
+                    > upload_utils.UPLOAD_MAX_BYTES
+                    or stream.decoder.decoded_seconds > asr_utils.STREAM_MAX_SECONDS
+                ):
+                    stream.abort()
+                    await websocket.close(code=status.WS_1009_MESSAGE_TOO_BIG)
+                    return
+                recording.extend(message["bytes"])
+                await stream.feed(message["bytes"])
+                if stream.partial_due and (partial_task is None or partial_task.done()):
+                    partial_task = asyncio.ensure_future(
+                        send_partial_transcript(websocket, stream)
+                    )
+            elif message.get("text"):
+                control = json.loads(message["text"])
+                if control.get("type") == "stop":
+                    completion_percentage = int(control.get("completion_percentage", 0))
+                    break
 
-        # Configure the voice request
-        voice = texttospeech.VoiceSelectionParams(
-            language_code="en-IN",  # Change language as needed
-            name="en-IN-Wavenet-D",  # Use a high-quality voice
+        transcript_text, samples = await stream.finish()
+        if partial_task is not None:
+            await partial_task
+
+        duration_seconds = len(samples) / float(audio_utils.ASR_SAMPLE_RATE)
+        voice_activity = audio_utils.detect_voice_activity(samples)
+        await transcription_utils.store_transcript(
+            interview_obj_id,
+            question_id,
+            transcript_text,
+            duration_seconds,
+            voice_activity,
+            completion_percentage,
+            audio_archive_key=transcription_utils.archive_answer_audio(
+                interview_obj_id, question_id, bytes(recording)
+            ),
+        )
+        transcription_utils.schedule_answer_analysis(
+            interview_obj_id,
+            question_id,
+            question_text,
+            transcript_text,
+            (
+                voice_activity.speaking_time_seconds
+                if voice_activity.has_speech
+                else duration_seconds
+            ),
+            samples=samples,
+            voice_activity=voice_activity,
         )
 
-        # Configure the audio output
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3,  # Use MP3 for better compatibility
+        await websocket.send_json(
+            {
+                "type": "final",
+                "transcript": transcript_text,
+                "analysis_status": transcription_utils.ANALYSIS_PENDING,
+                "message": f"Transcription complete for question {question_id}",
+            }
         )
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        stream.abort()
+    except Exception as e:
+        logging.exception("Error in streaming transcription")
+        stream.abort()
+        await websocket.send_json({"type": "error", "message": str(e)})
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+
+
+# Clips are content-addressed, so a URL's bytes never change.
+AUDIO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def speech_response(speech: tts_utils.CachedSpeech, headers: dict = None):
+    tts_utils.get_tts_cache().record_served(speech.fmt, speech.size)
+    if speech.path is not None:
+        # Disk hits are streamed from the file rather than read into memory.
+        return FileResponse(speech.path, media_type=speech.media_type, headers=headers)
+    return StreamingResponse(
+        io.BytesIO(speech.data), media_type=speech.media_type, headers=headers
+    )
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison.
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def parse_byte_range(range_header: str, size: int):
+    """Return ``(start, end)`` of a single byte range, or None for the whole clip.
+
+    Raises ValueError when the range cannot be satisfied.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Range not satisfiable for {size} bytes")
+    return start, end
+
 
-        # Perform the text-to-speech request
-        response = client.synthesize_speech(
-            input=synthesis_input, voice=voice, audio_config=audio_config
+def ranged_speech_response(speech: tts_utils.CachedSpeech, range_header: str, headers):
+    """Answer a range request for a clip.
+
+    Disk clips get Range handling from FileResponse; in-memory clips are
+    sliced here. Anything but a single byte range gets the whole clip.
+    """
+    cache = tts_utils.get_tts_cache()
+    size = speech.size
+    try:
+        byte_range = parse_byte_range(range_header, size)
+    except ValueError:
+        return Response(
+            status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"}
         )
+    if byte_range is None:
+        return speech_response(speech, headers)
+
+    start, end = byte_range
+    cache.record_served(speech.fmt, end - start + 1)
+    if speech.path is not None:
+        return FileResponse(speech.path, media_type=speech.media_type, headers=headers)
+    return Response(
+        content=speech.data[start : end + 1],
+        status_code=206,
+        media_type=speech.media_type,
+        headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"},
+    )
+
+
+@router.post("/synthesize_speech")
+async def synthesize_speech(
+    request: schemas.TextToSpeechRequest,
+    http_request: Request,
+    stream: bool = Query(False),
+    audio_format: str = Query(None, alias="format"),
+    redis: redis_asyncio.Redis = Depends(cache_utils.get_redis),
+):
+    """Speak ``text`` in the format chosen by ``format`` or the Accept header.
+
+    Profiles are ``mp3`` (default), ``mp3-low`` and ``opus``; a client sending
+    ``Save-Data: on`` without a choice gets the smallest one it accepts.
+    """
+    fmt = tts_utils.negotiate_format(
+        audio_format,
+        accept=http_request.headers.get("accept"),
+        save_data=http_request.headers.get("save-data") == "on",
+    )
+    headers = {"Vary": "Accept, Save-Data"}
 
-        # Wrap the audio content in a BytesIO stream and return as a StreamingResponse
+    # Only MP3 clips can be concatenated into one progressive stream.
+    if stream and fmt.media_type == "audio/mpeg":
+        # Playback can start after the first sentence is synthesized.
         return StreamingResponse(
-            io.BytesIO(response.audio_content), media_type="audio/mpeg"
+            tts_utils.stream_speech(request.text, fmt=fmt),
+            media_type=fmt.media_type,
+            headers=headers,
         )
+    try:
+        speech = await tts_utils.get_tts_cache().get(request.text, fmt=fmt)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    # Points clients at the cacheable GET for later plays.
+    await tts_utils.remember_texts(redis, [request.text], fmt)
+    headers["Content-Location"] = speech_audio_url(request.text, fmt)
+    return speech_response(speech, headers=headers)
+
+
+@router.get("/audio/{key}")
+async def get_speech_audio(
+    key: str,
+    request: Request,
+    audio_format: str = Query(None, alias="format"),
+    redis: redis_asyncio.Redis = Depends(cache_utils.get_redis),
+):
+    """Serve a synthesized clip by its content hash.
+
+    Responses carry a strong ETag and a year-long immutable Cache-Control so
+    browsers and the CDN can keep them; revalidations are answered with 304
+    without touching the cache, and Range requests are honoured for seeking.
+    A clip no longer in any cache tier is synthesized again from the text
+    recorded when its URL was handed out.
+    """
+    etag = f'"{key}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": AUDIO_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    fmt = tts_utils.negotiate_format(audio_format or tts_utils.DEFAULT_TTS_FORMAT.name)
+    speech = await tts_utils.get_tts_cache().lookup(key, fmt)
+    if speech is None:
+        try:
+            speech = await tts_utils.recall_speech(redis, key, fmt)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    if speech is None:
+        raise HTTPException(status_code=404, detail="Audio not found.")
+
+    # FileResponse checks If-Range against its own validators, so
+    # conditional ranges on disk clips get the full clip.
+    range_header = request.headers.get("range")
+    if range_header:
+        if_range = request.headers.get("if-range")
+        if not if_range or if_range.strip() == etag:
+            return ranged_speech_response(speech, range_header, headers)
+    return speech_response(speech, headers)
+
+
+@router.get("/tts_cache/stats")
+async def tts_cache_stats(current_user: str = Depends(auth.get_current_user)):
+    return JSONResponse(content=tts_utils.get_tts_cache().hit_rates())
 
 
 @router.get("/check_review")
 async def check_review_availability(
-    interview_id: str = Query(...), current_user: str = Depends(auth.get_current_user)
+    interview_id: str = Query(...), db_user: User = Depends(auth.get_current_user_doc)
 ):
-
-    db_user = await User.find_one(User.email == current_user)
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found.")
-
     try:
         interview_obj_id = ObjectId(interview_id)
     except:
@@ -805,12 +1256,8 @@ async def check_review_availability(
 
 @router.post("/create_order")
 async def proceed_payment(
-    interview_id: str = Query(...), current_user: str = Depends(auth.get_current_user)
+    interview_id: str = Query(...), db_user: User = Depends(auth.get_current_user_doc)
 ):
-    db_user = await User.find_one(User.email == current_user)
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found.")
-
     try:
         interview_obj_id = ObjectId(interview_id)
     except:
@@ -855,7 +1302,7 @@ async def proceed_payment(
 async def verify_payment(
     payload: schemas.VerifyPaymentInput,
     interview_id: str = Query(...),
-    current_user: str = Depends(auth.get_current_user),
+    db_user: User = Depends(auth.get_current_user_doc),
 ):
     data = {
         "razorpay_order_id": payload.order_id,
@@ -867,11 +1314,6 @@ async def verify_payment(
     except razorpay.errors.SignatureVerificationError:
         raise HTTPException(status_code=400, detail="Invalid Razorpay signature")
 
-    # 2) Identify the user making this call
-    db_user = await User.find_one(User.email == current_user)
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     existing_payment = await Payment.find_one(
         Payment.transaction_id == payload.payment_id
     )
@@ -990,12 +1432,8 @@ async def razorpay_webhook(request: Request):
 
 @router.get("/interview/status")
 async def interview_payment_status(
-    interview_id: str = Query(...), current_user: str = Depends(auth.get_current_user)
+    interview_id: str = Query(...), db_user: User = Depends(auth.get_current_user_doc)
 ):
-    db_user = await User.find_one(User.email == current_user)
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     try:
         interview_obj_id = ObjectId(interview_id)
     except:
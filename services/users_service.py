@@ -1,4 +1,12 @@
-from fastapi import Depends, File, HTTPException, APIRouter, Query, UploadFile
+from fastapi import (
+    BackgroundTasks,
+    Depends,
+    File,
+    HTTPException,
+    APIRouter,
+    Query,
+    UploadFile,
+)
 from fastapi.responses import JSONResponse
 from models.users import User
 from models.company import Company
@@ -11,8 +19,6 @@ import json
 from typing import List
 from datetime import datetime
 import os
-import boto3
-from io import BytesIO
 import sib_api_v3_sdk
 from sib_api_v3_sdk.rest import ApiException
 import random
@@ -22,8 +28,9 @@ import redis.asyncio as redis_asyncio
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 from dotenv import load_dotenv
-import openai_utils
+import cache_utils
 import common_utils
+import resume_utils
 from bson import ObjectId
 
 load_dotenv()
@@ -33,14 +40,6 @@ router = APIRouter()
 OTP_EXPIRY_SECONDS = 300
 
 
-async def get_redis():
-    redis = redis_asyncio.from_url(os.getenv("REDIS_URI"), decode_responses=True)
-    try:
-        yield redis
-    finally:
-        await redis.close()
-
-
 def otp_redis_key(email: str) -> str:
     return f"otp:{email}"
 
@@ -161,7 +160,8 @@ async def send_email_otp(email: str, otp: int):
 
 @router.post("/signup", response_model=schemas.Message)
 async def signup(
-    user: schemas.UserCreate, redis: redis_asyncio.Redis = Depends(get_redis)
+    user: schemas.UserCreate,
+    redis: redis_asyncio.Redis = Depends(cache_utils.get_redis),
 ):
     logging.info(f"New User Signup: {user.name} - {user.email}")
     # Check if a user with this email already exists
@@ -218,7 +218,7 @@ async def signup(
 @router.post("/verifySignOtp", response_model=schemas.VerifyOtpResponse)
 async def verify_signup_otp(
     data: schemas.VerifySignupOTPRequest,
-    redis: redis_asyncio.Redis = Depends(get_redis),
+    redis: redis_asyncio.Redis = Depends(cache_utils.get_redis),
 ):
 
     pending_key = f"pending_signup:{data.email}"
@@ -256,7 +256,7 @@ async def verify_signup_otp(
     await redis.delete(pending_key)
 
     # Generate a JWT token for the new user.
-    token = auth.create_access_token(data={"sub": new_user.email})
+    token = auth.create_user_access_token(new_user)
 
     return JSONResponse(content={"token": token, "user": new_user.email})
 
@@ -264,13 +264,15 @@ async def verify_signup_otp(
 @router.patch("/profile", response_model=dict)
 async def update_profile(
     profile: schemas.UserProfile,
-    current_user: str = Depends(auth.get_current_user),
+    db_user: User = Depends(auth.get_current_user_doc),
 ):
     try:
         logging.info(f"Update profile with data: {profile}")
-        db_user = await User.find_one(User.email == current_user)
+        # The dependency's copy may be cached; save over a fresh read instead.
+        db_user = await User.get(db_user.id)
         if not db_user:
             raise HTTPException(status_code=404, detail="User not found.")
+        current_user = db_user.email
 
         if profile.mobile_number != db_user.mobile_number:
             existing_user = await User.find_one(
@@ -301,6 +303,7 @@ async def update_profile(
             setattr(db_user, field_name, value)
 
         await db_user.save()
+        auth.invalidate_user(db_user.id)
 
         return {"message": "Profile updated successfully."}
     except Exception as e:
@@ -309,11 +312,8 @@ async def update_profile(
 
 
 @router.get("/profile", response_model=dict)
-async def get_profile(current_user: str = Depends(auth.get_current_user)):
+async def get_profile(db_user: User = Depends(auth.get_current_user_doc)):
     try:
-        db_user = await User.find_one(User.email == current_user)
-        if not db_user:
-            raise HTTPException(status_code=404, detail="User not found.")
 
         profile_data = db_user.model_dump()
 
@@ -343,7 +343,8 @@ async def get_profile(current_user: str = Depends(auth.get_current_user)):
 
 @router.post("/sendOtp", response_model=schemas.OtpResponse)
 async def send_otp_api(
-    request: schemas.SendOtpRequest, redis: redis_asyncio.Redis = Depends(get_redis)
+    request: schemas.SendOtpRequest,
+    redis: redis_asyncio.Redis = Depends(cache_utils.get_redis),
 ):
     email = request.email
     logging.info(f"Send OTP request for {email}")
@@ -384,7 +385,8 @@ async def send_otp_api(
 
 @router.post("/resendOtp", response_model=schemas.OtpResponse)
 async def resend_otp_api(
-    request: schemas.SendOtpRequest, redis: redis_asyncio.Redis = Depends(get_redis)
+    request: schemas.SendOtpRequest,
+    redis: redis_asyncio.Redis = Depends(cache_utils.get_redis),
 ):
     # country_code = request.country_code.replace("+", "")
     # mobile_number = request.mobile_number
@@ -430,7 +432,8 @@ async def resend_otp_api(
 
 @router.post("/verifyOtp", response_model=schemas.VerifyOtpResponse)
 async def verify_otp_api(
-    request: schemas.VerifyOtpRequest, redis: redis_asyncio.Redis = Depends(get_redis)
+    request: schemas.VerifyOtpRequest,
+    redis: redis_asyncio.Redis = Depends(cache_utils.get_redis),
 ):
     # country_code = request.country_code.replace("+", "")
     # mobile_number = request.mobile_number
@@ -469,8 +472,8 @@ async def verify_otp_api(
     # OTP is valid; remove the OTP data from Redis.
     await redis.delete(key)
 
-    # Generate a JWT token (assuming auth.create_access_token exists and uses user's unique field, e.g., email).
-    token = auth.create_access_token(data={"sub": user.email})
+    # Generate a JWT token carrying the user's email and id.
+    token = auth.create_user_access_token(user)
     return JSONResponse(content={"token": token, "user": user.email})
 
 
@@ -492,50 +495,56 @@ async def get_companies():
     return JSONResponse(content=companies)
 
 
+async def attach_resume(
+    background_tasks: BackgroundTasks, user_doc: User, key: str, resume_text: str
+):
+    """Save the resume on the profile; the summary follows in the background."""
+    await user_doc.set(
+        {
+            User.resume: key,
+            User.resume_summary: None,
+            User.skills: None,
+            User.tools: None,
+            User.domains: None,
+        }
+    )
+    auth.invalidate_user(user_doc.id)
+
+    background_tasks.add_task(
+        resume_utils.summarize_resume_for_user, user_doc.id, key, resume_text
+    )
+    logging.info(f"Resume {key} uploaded, summary scheduled.")
+
+
 @router.post("/profile/resume", response_model=dict)
 async def upload_resume(
-    file: UploadFile = File(...), current_user: str = Depends(auth.get_current_user)
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    user_doc: User = Depends(auth.get_current_user_doc),
 ):
-    user_doc = await User.find_one(User.email == current_user)
-    if not user_doc:
-        raise HTTPException(status_code=404, detail="User not found.")
-
     try:
         original_filename = file.filename or "resume"
         unique_filename = generate_random_filename(original_filename)
-
-        bucket_name = "mockai-resume"
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_ACCESS_SECRET_KEY"),
-            region_name=os.getenv("AWS_ACCESS_REGION"),
-        )
         file_content = await file.read()
-        await file.seek(0)  # Reset pointer for later use
-
-        # Upload to S3
-        s3_client.upload_fileobj(
-            BytesIO(file_content),
-            bucket_name,
-            unique_filename,
-            ExtraArgs={"ContentType": file.content_type},
-        )
 
-        # Extract and summarize
-        resume_url = f"https://{bucket_name}.s3.amazonaws.com/{unique_filename}"
-        resume_text = common_utils.extract_resume_text_from_s3_url(resume_url)
-        resume_summary = openai_utils.summarize_resume(resume_text)
+        # Text comes straight from the uploaded bytes instead of downloading
+        # the file back from S3. Extraction stops after the first few pages,
+        # so it runs first and oversized files are rejected before upload.
+        resume_text = await resume_utils.extract_resume_text(file_content)
+        await resume_utils.store_resume(
+            unique_filename, file_content, file.content_type
+        )
 
-        # Save to user profile
-        user_doc.resume = unique_filename
-        user_doc.resume_summary = resume_summary  # <-- store summary
-        await user_doc.save()
-        logging.info(f"Resume uploaded and summarized successfully. {resume_summary}")
+        await attach_resume(background_tasks, user_doc, unique_filename, resume_text)
         return {
             "message": "Resume uploaded successfully.",
         }
 
+    except common_utils.ResumeTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except resume_utils.ResumeParseError as e:
+        logging.warning(f"Rejected resume {file.filename}: {e}")
+        raise HTTPException(status_code=422, detail="Could not read this resume.")
     except Exception as e:
         logging.exception("Error uploading resume to AWS S3.")
         raise HTTPException(
@@ -544,19 +553,77 @@ async def upload_resume(
         )
 
 
+@router.post("/profile/resume/upload-url", response_model=dict)
+async def create_resume_upload(
+    request: schemas.ResumeUploadRequest,
+    user_doc: User = Depends(auth.get_current_user_doc),
+):
+    """Issue a presigned form for uploading a resume directly to S3."""
+    if request.content_type not in resume_utils.RESUME_UPLOAD_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported content type. Allowed: {', '.join(resume_utils.RESUME_UPLOAD_CONTENT_TYPES)}",
+        )
+
+    key = resume_utils.resume_upload_prefix(user_doc.id) + generate_random_filename(
+        request.filename or "resume"
+    )
+    post = resume_utils.presign_resume_upload(key, request.content_type)
+    return {
+        "key": key,
+        "url": post["url"],
+        "fields": post["fields"],
+        "max_bytes": common_utils.RESUME_MAX_BYTES,
+        "expires_in": resume_utils.RESUME_PRESIGN_EXPIRES_SECONDS,
+    }
+
+
+@router.post("/profile/resume/complete", response_model=dict)
+async def complete_resume_upload(
+    request: schemas.ResumeUploadComplete,
+    background_tasks: BackgroundTasks,
+    user_doc: User = Depends(auth.get_current_user_doc),
+):
+    """Verify a direct upload, extract its text and schedule the summary."""
+    if not request.key.startswith(resume_utils.resume_upload_prefix(user_doc.id)):
+        raise HTTPException(status_code=403, detail="Not your upload.")
+    if user_doc.resume == request.key:
+        return {"message": "Resume uploaded successfully."}
+
+    try:
+        file_content = await resume_utils.fetch_uploaded_resume(request.key)
+        if file_content is None:
+            raise HTTPException(status_code=404, detail="Uploaded resume not found.")
+        resume_text = await resume_utils.extract_resume_text(file_content)
+        await attach_resume(background_tasks, user_doc, request.key, resume_text)
+        return {"message": "Resume uploaded successfully."}
+
+    except HTTPException:
+        raise
+    except common_utils.ResumeTooLarge as e:
+        await resume_utils.delete_resume(request.key)
+        raise HTTPException(status_code=413, detail=str(e))
+    except resume_utils.ResumeParseError as e:
+        logging.warning(f"Rejected resume {request.key}: {e}")
+        await resume_utils.delete_resume(request.key)
+        raise HTTPException(status_code=422, detail="Could not read this resume.")
+    except Exception as e:
+        logging.exception(f"Error completing resume upload {request.key}.")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error uploading resume. Please try again later. {str(e)}",
+        )
+
+
 @router.post("/profile/about", response_model=dict)
 async def update_about(
-    req: schemas.AboutRequest, current_user: str = Depends(auth.get_current_user)
+    req: schemas.AboutRequest, db_user: User = Depends(auth.get_current_user_doc)
 ):
     try:
         logging.info(f"Update about with data: {req.about}")
 
-        db_user = await User.find_one(User.email == current_user)
-        if not db_user:
-            raise HTTPException(status_code=404, detail="User not found.")
-
-        db_user.aboutMe = req.about
-        await db_user.save()
+        await db_user.set({User.aboutMe: req.about})
+        auth.invalidate_user(db_user.id)
 
         return {"message": "Updated successfully."}
 
@@ -572,12 +639,7 @@ async def update_about(
 
 
 @router.get("/dashboard", response_model=dict)
-async def dashboard(current_user: str = Depends(auth.get_current_user)):
-
-    user = await User.find_one(User.email == current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found.")
-
+async def dashboard(user: User = Depends(auth.get_current_user_doc)):
     interviews = await Interview.find(Interview.user_id.id == user.id).to_list()
 
     interviews_list = []
@@ -736,12 +798,9 @@ async def dashboard(current_user: str = Depends(auth.get_current_user)):
 @router.post("/feedback", response_model=dict)
 async def give_feedback(
     feedback: schemas.FeedbackRequest,
-    current_user: str = Depends(auth.get_current_user),
+    db_user: User = Depends(auth.get_current_user_doc),
 ):
     try:
-        db_user = await User.find_one(User.email == current_user)
-        if not db_user:
-            raise HTTPException(status_code=404, detail="User not found.")
         interview_id = ObjectId(feedback.interview_id)
         interview_doc = await Interview.get(interview_id)
         if not interview_doc:
@@ -753,8 +812,8 @@ async def give_feedback(
             interview_id=interview_doc,
         )
         await feedback_doc.create()
-        db_user.is_feedback_given = True
-        await db_user.save()
+        await db_user.set({User.is_feedback_given: True})
+        auth.invalidate_user(db_user.id)
         return {"message": "Feedback given successfully."}
     except Exception as e:
         logging.error(f"Error creating feedback: {str(e)}")
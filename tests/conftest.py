@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+# openai_utils builds its clients at import time.
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+
+@pytest.fixture(scope="session")
+def mongo_uri():
+    """URI of a real mongod: MONGO_TEST_URI, or a throwaway local one.
+
+    The throwaway server comes from pymongo_inmemory, which downloads a
+    mongod binary on first use. Tests using this are marked ``mongo`` and
+    only run with ``-m mongo``; there, a missing mongod is a failure.
+    """
+    uri = os.getenv("MONGO_TEST_URI")
+    if uri:
+        yield uri
+        return
+
+    try:
+        from pymongo_inmemory.context import Context
+        from pymongo_inmemory.mongod import Mongod
+
+        mongod = Mongod(Context())
+        mongod.start()
+    except Exception as e:
+        pytest.fail(f"No mongod: set MONGO_TEST_URI or install pymongo_inmemory ({e})")
+    try:
+        yield mongod.connection_string
+    finally:
+        mongod.stop()
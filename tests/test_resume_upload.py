@@ -0,0 +1,137 @@
+import socket
+from types import SimpleNamespace
+
+import fitz
+import pytest
+import requests
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+moto_server = pytest.importorskip("moto.server")
+
+import auth
+import common_utils
+import resume_utils
+from services import users_service
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_pdf(text: str) -> bytes:
+    with fitz.open() as doc:
+        doc.new_page().insert_text((72, 72), text)
+        return doc.tobytes()
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """A moto S3 server holding the resume bucket, used by resume_utils."""
+    port = free_port()
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    server.start()
+    monkeypatch.setenv("S3_ENDPOINT_URL", f"http://127.0.0.1:{port}")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_ACCESS_SECRET_KEY", "test")
+    monkeypatch.setenv("AWS_ACCESS_REGION", "us-east-1")
+    resume_utils.get_s3_client.cache_clear()
+    client = resume_utils.get_s3_client()
+    client.create_bucket(Bucket=resume_utils.RESUME_BUCKET)
+    try:
+        yield client
+    finally:
+        resume_utils.get_s3_client.cache_clear()
+        server.stop()
+
+
+@pytest.fixture
+def user():
+    return SimpleNamespace(id=ObjectId(), resume=None)
+
+
+@pytest.fixture
+def attached(monkeypatch):
+    """Records attach_resume calls instead of writing the user."""
+    calls = []
+
+    async def attach_resume(background_tasks, user_doc, key, resume_text):
+        calls.append((key, resume_text))
+
+    monkeypatch.setattr(users_service, "attach_resume", attach_resume)
+    return calls
+
+
+@pytest.fixture
+def api(user):
+    app = FastAPI()
+    app.include_router(users_service.router)
+    app.dependency_overrides[auth.get_current_user_doc] = lambda: user
+    with TestClient(app) as client:
+        yield client
+
+
+def object_exists(s3, key: str) -> bool:
+    listing = s3.list_objects_v2(Bucket=resume_utils.RESUME_BUCKET, Prefix=key)
+    return listing.get("KeyCount", 0) > 0
+
+
+def test_presign_post_complete(s3, api, user, attached):
+    response = api.post(
+        "/profile/resume/upload-url",
+        json={"filename": "cv.pdf", "content_type": "application/pdf"},
+    )
+    assert response.status_code == 200
+    upload = response.json()
+    assert upload["key"].startswith(f"uploads/{user.id}/")
+
+    posted = requests.post(
+        upload["url"],
+        data=upload["fields"],
+        files={"file": ("cv.pdf", make_pdf("Jane Doe, backend engineer"))},
+        timeout=10,
+    )
+    assert posted.status_code in (200, 201, 204)
+
+    response = api.post("/profile/resume/complete", json={"key": upload["key"]})
+    assert response.status_code == 200
+    assert len(attached) == 1
+    key, resume_text = attached[0]
+    assert key == upload["key"]
+    assert "Jane Doe" in resume_text
+
+
+def test_complete_rejects_oversized_object(s3, api, user, attached, monkeypatch):
+    monkeypatch.setattr(common_utils, "RESUME_MAX_BYTES", 1024)
+    key = f"uploads/{user.id}/big.pdf"
+    # Written directly, as by a client that got around the POST policy.
+    s3.put_object(
+        Bucket=resume_utils.RESUME_BUCKET,
+        Key=key,
+        Body=b"%PDF-" + b"0" * 4096,
+        ContentType="application/pdf",
+    )
+
+    response = api.post("/profile/resume/complete", json={"key": key})
+    assert response.status_code == 413
+    assert not attached
+    assert not object_exists(s3, key)
+
+
+def test_complete_rejects_key_outside_user_prefix(s3, api, attached):
+    key = f"uploads/{ObjectId()}/cv.pdf"
+    s3.put_object(
+        Bucket=resume_utils.RESUME_BUCKET,
+        Key=key,
+        Body=make_pdf("Someone else"),
+        ContentType="application/pdf",
+    )
+
+    response = api.post("/profile/resume/complete", json={"key": key})
+    assert response.status_code == 403
+    assert not attached
+    # Another user's upload is left alone.
+    assert object_exists(s3, key)
@@ -0,0 +1,154 @@
+import asyncio
+import io
+import json
+import wave
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+import pytest
+from beanie import init_beanie
+from bson import DBRef, ObjectId
+from fakeredis import aioredis as fake_aioredis
+from fastapi import FastAPI
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import archive_utils
+import asr_utils
+import auth
+import cache_utils
+import database
+import openai_utils
+import transcription_utils
+from models.interview import Interview
+from services import interview_service
+
+pytestmark = pytest.mark.mongo
+
+ANSWERS = 10
+
+
+def make_wav(seconds: float, rate: int = 16000) -> bytes:
+    """A tone of ``seconds`` seconds, so every answer has its own duration."""
+    t = np.arange(int(seconds * rate)) / rate
+    pcm = (0.3 * np.sin(2 * np.pi * 220 * t) * 32767).astype(np.int16)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+def answer_seconds(i: int) -> float:
+    return 1 + i / 10
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """Stub transcriber and scorer, no archival."""
+    monkeypatch.setattr(
+        asr_utils, "get_transcriber", lambda backend=None: asr_utils.StubTranscriber()
+    )
+    monkeypatch.setattr(
+        openai_utils,
+        "analyze_audio",
+        lambda **kwargs: {"text": json.dumps({"fluency_score": 80.0})},
+    )
+    monkeypatch.setattr(
+        archive_utils,
+        "get_archiver",
+        lambda backend=None: archive_utils._DisabledArchiver(),
+    )
+
+
+def make_app(user) -> FastAPI:
+    redis = fake_aioredis.FakeRedis(decode_responses=True)
+
+    async def get_redis():
+        yield redis
+
+    app = FastAPI()
+    app.include_router(interview_service.router, prefix="/interview")
+    app.dependency_overrides[auth.get_current_user_doc] = lambda: user
+    app.dependency_overrides[cache_utils.get_redis] = get_redis
+    return app
+
+
+async def upload_answers_concurrently(mongo_uri: str):
+    client = AsyncIOMotorClient(mongo_uri)
+    db_name = f"test_transcribe_{ObjectId()}"
+    try:
+        await init_beanie(
+            database=client[db_name], document_models=database.document_models()
+        )
+        user = SimpleNamespace(id=ObjectId())
+        interview_id = ObjectId()
+        await Interview.get_motor_collection().insert_one(
+            {
+                "_id": interview_id,
+                "user_id": DBRef("users", user.id),
+                "question_responses": [
+                    {"question_id": f"q{i}", "question": f"Question {i}?"}
+                    for i in range(ANSWERS)
+                ],
+                "completion_percentage": 0,
+            }
+        )
+
+        transport = httpx.ASGITransport(app=make_app(user))
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as http:
+            responses = await asyncio.gather(
+                *(
+                    http.post(
+                        "/interview/transcribe",
+                        params={
+                            "question_id": f"q{i}",
+                            "interview_id": str(interview_id),
+                            "completion_percentage": (i + 1) * 100 // ANSWERS,
+                        },
+                        files={
+                            "audio": (
+                                f"q{i}.wav",
+                                make_wav(answer_seconds(i)),
+                                "audio/wav",
+                            )
+                        },
+                    )
+                    for i in range(ANSWERS)
+                )
+            )
+        await transcription_utils.wait_for_answer_analyses(
+            interview_id, [f"q{i}" for i in range(ANSWERS)]
+        )
+
+        stored = await Interview.get_motor_collection().find_one({"_id": interview_id})
+        return responses, stored
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+
+def test_parallel_uploads_to_one_interview_are_all_stored(mongo_uri, offline):
+    responses, stored = asyncio.run(upload_answers_concurrently(mongo_uri))
+
+    for response in responses:
+        assert response.status_code == 200, response.text
+        assert response.json()["transcript"]
+
+    answers = {
+        qr["question_id"]: qr.get("speech_analysis")
+        for qr in stored["question_responses"]
+    }
+    assert len(answers) == ANSWERS
+    for i in range(ANSWERS):
+        analysis = answers[f"q{i}"]
+        assert analysis is not None, f"answer to q{i} was lost"
+        assert analysis["transcript"]
+        assert analysis["time_seconds"] == pytest.approx(answer_seconds(i), abs=0.05)
+        assert analysis["analysis_status"] == transcription_utils.ANALYSIS_COMPLETE
+        assert analysis["fluency_score"] == 80.0
+    assert stored["completion_percentage"] == 100
@@ -0,0 +1,581 @@
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from beanie.odm.utils.encoder import Encoder
+from pymongo import UpdateOne
+from fastapi import HTTPException
+from dotenv import load_dotenv
+
+from models.interview import Interview, SpeechAnalysis, ProsodyFeatures
+import archive_utils
+import asr_utils
+import audio_utils
+import openai_utils
+
+load_dotenv()
+
+ANALYSIS_PENDING = "pending"
+ANALYSIS_COMPLETE = "complete"
+ANALYSIS_FAILED = "failed"
+
+# Bounds concurrent analyze_audio LLM calls (and prosody jobs) per worker.
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "4"))
+# How long submit_interview waits on analyses before redoing them itself.
+ANALYSIS_WAIT_SECONDS = float(os.getenv("ANALYSIS_WAIT_SECONDS", "45"))
+ANALYSIS_POLL_SECONDS = 1.0
+# Limits for /transcribe/batch: parts per request and concurrent ASR calls.
+BATCH_TRANSCRIBE_MAX_PARTS = int(os.getenv("BATCH_TRANSCRIBE_MAX_PARTS", "20"))
+BATCH_TRANSCRIBE_CONCURRENCY = int(os.getenv("BATCH_TRANSCRIBE_CONCURRENCY", "4"))
+
+_analysis_semaphore = asyncio.Semaphore(ANALYSIS_CONCURRENCY)
+_analysis_tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+
+
+def check_interview_owner(interview_raw: dict, user_id: ObjectId = None):
+    """Raise 403 unless the raw interview belongs to ``user_id`` (if given)."""
+    if user_id is None:
+        return
+    owner = interview_raw.get("user_id")
+    if owner is None or str(owner.id) != str(user_id):
+        raise HTTPException(
+            status_code=403, detail="Not authorized to access this interview."
+        )
+
+
+async def get_question_text(
+    interview_obj_id: ObjectId, question_id: str, user_id: ObjectId = None
+) -> str:
+    """Fetch a single question's text via an $elemMatch projection.
+
+    With ``user_id``, the interview must belong to that user.
+    """
+    interview_raw = await Interview.get_motor_collection().find_one(
+        {"_id": interview_obj_id},
+        {
+            "user_id": 1,
+            "question_responses": {"$elemMatch": {"question_id": question_id}},
+        },
+    )
+    if not interview_raw:
+        raise HTTPException(status_code=404, detail="Interview not found.")
+    check_interview_owner(interview_raw, user_id)
+
+    matched = interview_raw.get("question_responses") or []
+    if not matched or not matched[0].get("question"):
+        raise HTTPException(
+            status_code=404, detail="question_id not found in interview"
+        )
+    return matched[0]["question"]
+
+
+async def get_question_texts(
+    interview_obj_id: ObjectId, question_ids: List[str], user_id: ObjectId = None
+) -> Dict[str, str]:
+    """Fetch several questions' text, projecting away answers and reviews.
+
+    With ``user_id``, the interview must belong to that user.
+    """
+    interview_raw = await Interview.get_motor_collection().find_one(
+        {"_id": interview_obj_id},
+        {
+            "user_id": 1,
+            "question_responses.question_id": 1,
+            "question_responses.question": 1,
+        },
+    )
+    if not interview_raw:
+        raise HTTPException(status_code=404, detail="Interview not found.")
+    check_interview_owner(interview_raw, user_id)
+
+    questions = {
+        qr.get("question_id"): qr.get("question")
+        for qr in interview_raw.get("question_responses") or []
+    }
+    missing = [qid for qid in question_ids if not questions.get(qid)]
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"question_id not found in interview: {', '.join(missing)}",
+        )
+    return {qid: questions[qid] for qid in question_ids}
+
+
+def speech_analysis_update(
+    interview_obj_id: ObjectId,
+    question_id: str,
+    speech_analysis: SpeechAnalysis,
+    completion_percentage: int = None,
+) -> Tuple[dict, dict, list]:
+    """Build ``(filter, update, array_filters)`` writing one answer's analysis.
+
+    A positional ``$set`` touches only the matching question, so concurrent
+    uploads for different questions of the same interview cannot overwrite
+    each other the way a full-document ``save()`` would. Completion uses
+    ``$max`` so an out-of-order upload never moves progress backwards.
+    """
+    update = {
+        "$set": {
+            "question_responses.$[q].speech_analysis": Encoder().encode(speech_analysis)
+        }
+    }
+    if completion_percentage is not None:
+        update["$max"] = {"completion_percentage": completion_percentage}
+
+    return (
+        {"_id": interview_obj_id, "question_responses.question_id": question_id},
+        update,
+        [{"q.question_id": question_id}],
+    )
+
+
+async def set_speech_analysis(
+    interview_obj_id: ObjectId,
+    question_id: str,
+    speech_analysis: SpeechAnalysis,
+    completion_percentage: int = None,
+):
+    """Write one answer's analysis in place without loading the interview."""
+    query, update, array_filters = speech_analysis_update(
+        interview_obj_id, question_id, speech_analysis, completion_percentage
+    )
+    result = await Interview.get_motor_collection().update_one(
+        query, update, array_filters=array_filters
+    )
+    if result.matched_count == 0:
+        raise HTTPException(
+            status_code=404, detail="question_id not found in interview"
+        )
+
+
+async def set_speech_metrics(
+    interview_obj_id: ObjectId, question_id: str, transcript_text: str, fields: dict
+) -> bool:
+    """Fill in analysis fields on an already stored transcript.
+
+    The update only applies while the stored transcript is still the one that
+    was analyzed, so a slow analysis cannot overwrite a newer re-recording.
+    """
+    result = await Interview.get_motor_collection().update_one(
+        {"_id": interview_obj_id},
+        {
+            "$set": {
+                f"question_responses.$[q].speech_analysis.{name}": value
+                for name, value in fields.items()
+            }
+        },
+        array_filters=[
+            {
+                "q.question_id": question_id,
+                "q.speech_analysis.transcript": transcript_text,
+            }
+        ],
+    )
+    return result.modified_count > 0
+
+
+def pending_speech_analysis(
+    transcript_text: str,
+    duration_seconds: float,
+    voice_activity: audio_utils.VoiceActivity,
+    audio_archive_key: str = None,
+) -> SpeechAnalysis:
+    """The transcript and VAD metrics, with the scores still to come."""
+    if not transcript_text:
+        logging.warning(
+            f"Empty transcript returned from {asr_utils.get_transcriber().name} transcriber"
+        )
+    return SpeechAnalysis(
+        transcript=transcript_text,
+        time_seconds=duration_seconds,
+        speaking_time_seconds=voice_activity.speaking_time_seconds,
+        pause_count=voice_activity.pause_count,
+        longest_pause_seconds=voice_activity.longest_pause_seconds,
+        analysis_status=ANALYSIS_PENDING,
+        audio_archive_key=audio_archive_key,
+    )
+
+
+async def store_transcript(
+    interview_obj_id: ObjectId,
+    question_id: str,
+    transcript_text: str,
+    duration_seconds: float,
+    voice_activity: audio_utils.VoiceActivity,
+    completion_percentage: int,
+    audio_archive_key: str = None,
+):
+    """Persist the transcript and VAD metrics with the analysis still pending."""
+    await set_speech_analysis(
+        interview_obj_id,
+        question_id,
+        pending_speech_analysis(
+            transcript_text, duration_seconds, voice_activity, audio_archive_key
+        ),
+        completion_percentage=completion_percentage,
+    )
+
+
+async def clear_archive_key(interview_obj_id: ObjectId, question_id: str, key: str):
+    """Forget an archive key whose upload failed, unless it was replaced."""
+    await Interview.get_motor_collection().update_one(
+        {"_id": interview_obj_id},
+        {"$set": {"question_responses.$[q].speech_analysis.audio_archive_key": None}},
+        array_filters=[
+            {"q.question_id": question_id, "q.speech_analysis.audio_archive_key": key}
+        ],
+    )
+
+
+def archive_answer_audio(
+    interview_obj_id: ObjectId,
+    question_id: str,
+    audio_bytes: bytes,
+    content_type: str = None,
+) -> Optional[str]:
+    """Queue the original recording for archival and return its object key.
+
+    Returns None when the recording was not queued (archival disabled or the
+    queue full). If the upload fails later the stored key is cleared again.
+    """
+    key = archive_utils.answer_audio_key(
+        str(interview_obj_id), question_id, audio_bytes
+    )
+    queued = archive_utils.get_archiver().submit(
+        key,
+        audio_bytes,
+        content_type,
+        on_failure=lambda: clear_archive_key(interview_obj_id, question_id, key),
+    )
+    return key if queued else None
+
+
+async def analyze_answer(
+    interview_obj_id: ObjectId,
+    question_id: str,
+    question_text: str,
+    transcript_text: str,
+    speaking_seconds: float,
+    samples=None,
+    voice_activity: audio_utils.VoiceActivity = None,
+):
+    """Score a stored transcript (LLM) and, given the audio, its prosody."""
+    async with _analysis_semaphore:
+        try:
+            prosody_task = None
+            if samples is not None and voice_activity is not None:
+                prosody_task = asyncio.ensure_future(
+                    audio_utils.analyze_prosody(samples, voice_activity)
+                )
+
+            speech_metrics = await asyncio.to_thread(
+                openai_utils.analyze_audio,
+                question_text=question_text,
+                transcript_text=transcript_text,
+                duration_seconds=speaking_seconds,
+            )
+
+            # Parse the JSON response from speech_metrics
+            try:
+                metrics_dict = json.loads(speech_metrics["text"])
+                logging.info("Parsed metrics dict: %s", metrics_dict)
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                logging.error("Error parsing speech metrics: %s", e)
+                metrics_dict = {}
+
+            fields = {
+                "fluency_score": metrics_dict.get("fluency_score", 0.0),
+                "confidence_score": metrics_dict.get("confidence_score", 0.0),
+                "clarity_score": metrics_dict.get("clarity_score", 0.0),
+                "words_per_minute": metrics_dict.get("words_per_minute", 0.0),
+                "filler_words": metrics_dict.get("filler_words_used", []),
+                "answer_relevance_score": metrics_dict.get(
+                    "answer_relevance_score", 0.0
+                ),
+                "analysis_status": ANALYSIS_COMPLETE,
+            }
+            if prosody_task is not None:
+                prosody = await prosody_task
+                fields["prosody"] = Encoder().encode(
+                    ProsodyFeatures(**dataclasses.asdict(prosody))
+                )
+
+            await set_speech_metrics(
+                interview_obj_id, question_id, transcript_text, fields
+            )
+        except Exception:
+            logging.exception(
+                f"Answer analysis failed for {interview_obj_id}/{question_id}"
+            )
+            await set_speech_metrics(
+                interview_obj_id,
+                question_id,
+                transcript_text,
+                {"analysis_status": ANALYSIS_FAILED},
+            )
+
+
+def schedule_answer_analysis(
+    interview_obj_id: ObjectId,
+    question_id: str,
+    question_text: str,
+    transcript_text: str,
+    speaking_seconds: float,
+    samples=None,
+    voice_activity: audio_utils.VoiceActivity = None,
+):
+    """Run ``analyze_answer`` in the background of this worker."""
+    key = (str(interview_obj_id), question_id)
+    task = asyncio.ensure_future(
+        analyze_answer(
+            interview_obj_id,
+            question_id,
+            question_text,
+            transcript_text,
+            speaking_seconds,
+            samples=samples,
+            voice_activity=voice_activity,
+        )
+    )
+    _analysis_tasks[key] = task
+
+    def _forget(finished: asyncio.Task):
+        if _analysis_tasks.get(key) is finished:
+            del _analysis_tasks[key]
+
+    task.add_done_callback(_forget)
+
+
+async def wait_for_answer_analyses(interview_obj_id: ObjectId, question_ids: List[str]):
+    """Block until the given answers are analyzed.
+
+    Analyses running in this worker are awaited directly. Ones owned by
+    another worker are polled for, and any still outstanding at the deadline
+    (e.g. lost in a restart) are redone here from the stored transcript.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + ANALYSIS_WAIT_SECONDS
+
+    local_tasks = [
+        _analysis_tasks[(str(interview_obj_id), question_id)]
+        for question_id in question_ids
+        if (str(interview_obj_id), question_id) in _analysis_tasks
+    ]
+    if local_tasks:
+        await asyncio.wait(local_tasks, timeout=ANALYSIS_WAIT_SECONDS)
+
+    while True:
+        interview_raw = await Interview.get_motor_collection().find_one(
+            {"_id": interview_obj_id}, {"question_responses": 1}
+        )
+        outstanding = [
+            qr
+            for qr in (interview_raw or {}).get("question_responses") or []
+            if qr.get("question_id") in question_ids
+            and (qr.get("speech_analysis") or {}).get("analysis_status")
+            in (ANALYSIS_PENDING, ANALYSIS_FAILED)
+        ]
+        if not outstanding:
+            return
+
+        only_failed = all(
+            qr["speech_analysis"]["analysis_status"] == ANALYSIS_FAILED
+            for qr in outstanding
+        )
+        if only_failed or loop.time() >= deadline:
+            break
+        await asyncio.sleep(ANALYSIS_POLL_SECONDS)
+
+    logging.info(f"Re-running {len(outstanding)} outstanding answer analyses inline")
+    await asyncio.gather(
+        *[
+            analyze_answer(
+                interview_obj_id,
+                qr["question_id"],
+                qr["question"],
+                qr["speech_analysis"].get("transcript") or "",
+                qr["speech_analysis"].get("speaking_time_seconds")
+                or qr["speech_analysis"].get("time_seconds")
+                or 0,
+            )
+            for qr in outstanding
+        ]
+    )
+
+
+async def transcribe_answer_audio(
+    audio_bytes: bytes, samples=None
+) -> Tuple[audio_utils.NormalizedAudio, str]:
+    """Normalize one recording and return it with its transcript."""
+    # Downmix/resample to 16 kHz mono Opus and extract audio duration
+    try:
+        normalized_audio = await audio_utils.normalize_for_asr(
+            audio_bytes, samples=samples
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Could not decode audio. Ensure valid format. Error: {str(e)}",
+        )
+
+    transcript_text = await asr_utils.get_transcriber().transcribe(
+        normalized_audio.data,
+        filename=normalized_audio.filename,
+        content_type=normalized_audio.content_type,
+    )
+    return normalized_audio, transcript_text
+
+
+def schedule_normalized_analysis(
+    interview_obj_id: ObjectId,
+    question_id: str,
+    question_text: str,
+    transcript_text: str,
+    normalized_audio: audio_utils.NormalizedAudio,
+):
+    voice_activity = normalized_audio.voice_activity
+    schedule_answer_analysis(
+        interview_obj_id,
+        question_id,
+        question_text,
+        transcript_text,
+        (
+            voice_activity.speaking_time_seconds
+            if voice_activity.has_speech
+            else normalized_audio.duration_seconds
+        ),
+        samples=normalized_audio.samples,
+        voice_activity=voice_activity,
+    )
+
+
+async def process_answer_audio(
+    interview_obj_id: ObjectId,
+    question_id: str,
+    question_text: str,
+    audio_bytes: bytes,
+    completion_percentage: int,
+    samples=None,
+    content_type: str = None,
+) -> dict:
+    """Normalize and transcribe one answer, store it, and queue its analysis.
+
+    Returns as soon as the transcript is durable; the SpeechAnalysis scores
+    are filled in by the background analysis. The result is cached for
+    retries, so it carries no analysis status; see ``with_analysis_status``.
+    """
+    normalized_audio, transcript_text = await transcribe_answer_audio(
+        audio_bytes, samples=samples
+    )
+
+    await store_transcript(
+        interview_obj_id,
+        question_id,
+        transcript_text,
+        normalized_audio.duration_seconds,
+        normalized_audio.voice_activity,
+        completion_percentage,
+        audio_archive_key=archive_answer_audio(
+            interview_obj_id, question_id, audio_bytes, content_type
+        ),
+    )
+    schedule_normalized_analysis(
+        interview_obj_id, question_id, question_text, transcript_text, normalized_audio
+    )
+
+    return {
+        "message": f"Transcription complete for question {question_id}",
+        "transcript": transcript_text,
+    }
+
+
+async def with_analysis_status(
+    interview_obj_id: ObjectId, question_id: str, result: dict
+) -> dict:
+    """``result`` with the answer's current analysis status from Mongo."""
+    interview_raw = await Interview.get_motor_collection().find_one(
+        {"_id": interview_obj_id},
+        {"question_responses": {"$elemMatch": {"question_id": question_id}}},
+    )
+    matched = (interview_raw or {}).get("question_responses") or []
+    speech_analysis = (matched[0].get("speech_analysis") if matched else None) or {}
+    return {**result, "analysis_status": speech_analysis.get("analysis_status")}
+
+
+async def process_answer_batch(
+    interview_obj_id: ObjectId,
+    answers: List[Tuple[str, str, bytes, str]],
+    completion_percentage: int,
+) -> List[dict]:
+    """Transcribe several ``(question_id, question_text, audio, content_type)``
+    answers at once.
+
+    Recordings are normalized and transcribed concurrently, at most
+    ``BATCH_TRANSCRIBE_CONCURRENCY`` at a time, and every transcript is then
+    written with a single ``bulk_write``. A recording that fails is reported
+    in its own result without failing the rest of the batch.
+    """
+    semaphore = asyncio.Semaphore(BATCH_TRANSCRIBE_CONCURRENCY)
+
+    async def transcribe_one(audio_bytes: bytes):
+        async with semaphore:
+            return await transcribe_answer_audio(audio_bytes)
+
+    transcribed = await asyncio.gather(
+        *[transcribe_one(answer[2]) for answer in answers],
+        return_exceptions=True,
+    )
+
+    results = []
+    updates = []
+    stored = []
+    for answer, outcome in zip(answers, transcribed):
+        question_id, question_text, audio_bytes, content_type = answer
+        if isinstance(outcome, HTTPException):
+            results.append({"question_id": question_id, "error": outcome.detail})
+            continue
+        if isinstance(outcome, Exception):
+            logging.error(f"Batch transcription failed for {question_id}: {outcome}")
+            results.append({"question_id": question_id, "error": "Server error"})
+            continue
+
+        normalized_audio, transcript_text = outcome
+        query, update, array_filters = speech_analysis_update(
+            interview_obj_id,
+            question_id,
+            pending_speech_analysis(
+                transcript_text,
+                normalized_audio.duration_seconds,
+                normalized_audio.voice_activity,
+                archive_answer_audio(
+                    interview_obj_id, question_id, audio_bytes, content_type
+                ),
+            ),
+            completion_percentage=completion_percentage,
+        )
+        updates.append(UpdateOne(query, update, array_filters=array_filters))
+        stored.append((question_id, question_text, transcript_text, normalized_audio))
+        results.append(
+            {
+                "question_id": question_id,
+                "transcript": transcript_text,
+                "analysis_status": ANALYSIS_PENDING,
+            }
+        )
+
+    if updates:
+        await Interview.get_motor_collection().bulk_write(updates, ordered=False)
+
+    for question_id, question_text, transcript_text, normalized_audio in stored:
+        schedule_normalized_analysis(
+            interview_obj_id,
+            question_id,
+            question_text,
+            transcript_text,
+            normalized_audio,
+        )
+    return results
@@ -0,0 +1,517 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import aiofiles
+from cachetools import LRUCache
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from google.cloud import texttospeech
+from redis.exceptions import RedisError
+
+import archive_utils
+import audio_utils
+
+load_dotenv()
+
+TTS_LANGUAGE_CODE = "en-IN"
+TTS_VOICE_NAME = "en-IN-Wavenet-D"
+
+# In-process tier: most recently used clips, bounded by total bytes.
+TTS_MEMORY_CACHE_BYTES = int(os.getenv("TTS_MEMORY_CACHE_BYTES", str(32 * 1024 * 1024)))
+# Local disk tier, shared by the workers on a pod; oldest clips are evicted
+# once it grows past the limit. It shares the pod's small ephemeral storage
+# with the upload spool, so the default stays well under that limit.
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join("tmp_files", "tts"))
+TTS_DISK_CACHE_BYTES = int(os.getenv("TTS_DISK_CACHE_BYTES", str(32 * 1024 * 1024)))
+TTS_DISK_EVICT_TO = 0.9
+# Optional object-store tier shared by all pods: "gcs", "local" or empty.
+TTS_CACHE_STORE = os.getenv("TTS_CACHE_STORE", "")
+TTS_CACHE_BUCKET = os.getenv("TTS_CACHE_BUCKET", archive_utils.ARCHIVE_BUCKET)
+TTS_CACHE_STORE_DIR = os.getenv(
+    "TTS_CACHE_STORE_DIR", os.path.join("tmp_files", "tts-store")
+)
+TTS_CACHE_STORE_PREFIX = "tts-cache/"
+# The text behind every audio URL handed out is kept in Redis, so any pod can
+# synthesize a clip again once it has left all the cache tiers.
+TTS_TEXT_TTL_SECONDS = int(os.getenv("TTS_TEXT_TTL_SECONDS", str(30 * 24 * 60 * 60)))
+
+# Re-encoded bitrate of the low-bandwidth MP3 profile (Google's is 32 kbps).
+TTS_LOW_MP3_BITRATE = os.getenv("TTS_LOW_MP3_BITRATE", "16k")
+
+# Interview questions are synthesized ahead of playback, this many at a time.
+TTS_PRESYNTHESIS_CONCURRENCY = int(os.getenv("TTS_PRESYNTHESIS_CONCURRENCY", "4"))
+
+# Progressive streaming: sentences synthesized ahead of the one playing,
+# and the size of the chunks written to the response.
+TTS_STREAM_CONCURRENCY = int(os.getenv("TTS_STREAM_CONCURRENCY", "2"))
+TTS_STREAM_CHUNK_BYTES = 16 * 1024
+TTS_MIN_SENTENCE_CHARS = 20
+
+_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+_clients: Dict[asyncio.AbstractEventLoop, texttospeech.TextToSpeechAsyncClient] = {}
+
+
+def get_client() -> texttospeech.TextToSpeechAsyncClient:
+    # The gRPC asyncio channel is bound to the loop that created it.
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        _clients[loop] = texttospeech.TextToSpeechAsyncClient()
+    return _clients[loop]
+
+
+@dataclass(frozen=True)
+class TTSFormat:
+    """An output profile: Google encoding, optionally re-encoded to ``bitrate``."""
+
+    name: str
+    encoding: str
+    media_type: str
+    bitrate: Optional[str] = None
+
+    @property
+    def cache_id(self) -> str:
+        return f"{self.encoding}@{self.bitrate}" if self.bitrate else self.encoding
+
+
+TTS_FORMATS = {
+    "mp3": TTSFormat("mp3", "MP3", "audio/mpeg"),
+    "mp3-low": TTSFormat("mp3-low", "MP3", "audio/mpeg", bitrate=TTS_LOW_MP3_BITRATE),
+    "opus": TTSFormat("opus", "OGG_OPUS", "audio/ogg"),
+}
+DEFAULT_TTS_FORMAT = TTS_FORMATS["mp3"]
+
+# Accept media types mapped to profiles, smallest payload first on ties.
+_ACCEPT_FORMATS = [
+    ("audio/ogg", "opus"),
+    ("audio/opus", "opus"),
+    ("audio/mpeg", "mp3"),
+    ("audio/mp3", "mp3"),
+]
+
+
+def negotiate_format(
+    requested: str = None, accept: str = None, save_data: bool = False
+) -> TTSFormat:
+    """Pick an output profile from an explicit name or the Accept header.
+
+    With ``Save-Data`` and no explicit choice, the smallest profile the
+    client accepts wins: Opus if offered, otherwise low-bitrate MP3.
+    """
+    if requested:
+        if requested not in TTS_FORMATS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown audio format '{requested}'. "
+                f"Expected one of: {', '.join(TTS_FORMATS)}",
+            )
+        return TTS_FORMATS[requested]
+
+    preferences = {}
+    for part in (accept or "").split(","):
+        media_range, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_range:
+            preferences[media_range.lower()] = quality
+
+    best, best_quality = None, 0.0
+    for media_type, name in _ACCEPT_FORMATS:
+        quality = preferences.get(media_type, 0.0)
+        if quality > best_quality:
+            best, best_quality = name, quality
+
+    if save_data and best != "opus":
+        return TTS_FORMATS["mp3-low"]
+    return TTS_FORMATS[best] if best else DEFAULT_TTS_FORMAT
+
+
+def tts_cache_key(
+    text: str, voice: str = TTS_VOICE_NAME, fmt: TTSFormat = DEFAULT_TTS_FORMAT
+) -> str:
+    return hashlib.sha256(
+        f"{voice}\0{fmt.cache_id}\0{text}".encode("utf-8")
+    ).hexdigest()
+
+
+async def synthesize(
+    text: str, voice: str = TTS_VOICE_NAME, fmt: TTSFormat = DEFAULT_TTS_FORMAT
+) -> bytes:
+    response = await get_client().synthesize_speech(
+        input=texttospeech.SynthesisInput(text=text),
+        voice=texttospeech.VoiceSelectionParams(
+            language_code=TTS_LANGUAGE_CODE, name=voice
+        ),
+        audio_config=texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding[fmt.encoding]
+        ),
+    )
+    if fmt.bitrate:
+        return await audio_utils.encode_mp3(response.audio_content, fmt.bitrate)
+    return response.audio_content
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split ``text`` after sentence-ending punctuation, merging tiny pieces."""
+    sentences = []
+    for piece in _SENTENCE_END_RE.split(text.strip()):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if sentences and min(len(sentences[-1]), len(piece)) < TTS_MIN_SENTENCE_CHARS:
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        else:
+            sentences.append(piece)
+    return sentences
+
+
+@dataclass
+class CachedSpeech:
+    """A synthesized clip, either in memory (``data``) or on disk (``path``)."""
+
+    key: str
+    fmt: TTSFormat
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+    @property
+    def media_type(self) -> str:
+        return self.fmt.media_type
+
+    @property
+    def size(self) -> int:
+        return len(self.data) if self.data is not None else os.path.getsize(self.path)
+
+
+class TTSCache:
+    """Content-addressed cache of synthesized speech.
+
+    Lookups go memory -> local disk -> object store -> Google TTS. Disk hits
+    are returned as a path so the response can stream the file instead of
+    reading it into memory; object-store hits and fresh syntheses are written
+    to the faster tiers on the way back.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = TTS_CACHE_DIR,
+        memory_bytes: int = TTS_MEMORY_CACHE_BYTES,
+        disk_bytes: int = TTS_DISK_CACHE_BYTES,
+        store: archive_utils.ArchiveBackend = None,
+    ):
+        self.cache_dir = cache_dir
+        self.disk_bytes = disk_bytes
+        self.store = store
+        self._memory = LRUCache(maxsize=memory_bytes, getsizeof=len)
+        self._disk_usage = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._publishing = set()
+        self.stats = {"memory": 0, "disk": 0, "store": 0, "miss": 0}
+        self.bytes_served = {name: 0 for name in TTS_FORMATS}
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _scan_disk(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict_disk(self):
+        """Delete least recently used clips until the tier is under its limit."""
+        entries = self._scan_disk()
+        usage = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * TTS_DISK_EVICT_TO
+        for _, size, path in sorted(entries):
+            if usage <= target:
+                break
+            try:
+                os.remove(path)
+                usage -= size
+            except FileNotFoundError:
+                pass
+        self._disk_usage = usage
+
+    def _write_disk(self, key: str, data: bytes):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        if self._disk_usage is None:
+            self._disk_usage = sum(size for _, size, _ in self._scan_disk())
+        else:
+            self._disk_usage += len(data)
+        if self._disk_usage > self.disk_bytes:
+            self._evict_disk()
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        path = self._disk_path(key)
+        try:
+            # mtime doubles as the LRU clock for eviction.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) <= self._memory.maxsize:
+            self._memory[key] = data
+
+    def _cached(self, key: str, fmt: TTSFormat) -> Optional[CachedSpeech]:
+        data = self._memory.get(key)
+        if data is not None:
+            self.stats["memory"] += 1
+            return CachedSpeech(key, fmt, data=data)
+
+        path = self._read_disk(key)
+        if path is not None:
+            self.stats["disk"] += 1
+            return CachedSpeech(key, fmt, path=path)
+        return None
+
+    async def _from_store(self, key: str) -> Optional[bytes]:
+        if self.store is None:
+            return None
+        try:
+            data = await asyncio.to_thread(self.store.get, TTS_CACHE_STORE_PREFIX + key)
+        except Exception as e:
+            logging.warning(f"TTS store lookup failed for {key}: {e}")
+            return None
+        if data is not None:
+            self.stats["store"] += 1
+            self._remember(key, data)
+            await asyncio.to_thread(self._write_disk, key, data)
+        return data
+
+    async def _fill(
+        self,
+        key: str,
+        text: str,
+        voice: str,
+        fmt: TTSFormat,
+        limiter: asyncio.Semaphore = None,
+    ) -> bytes:
+        async with limiter or contextlib.nullcontext():
+            data = await self._from_store(key)
+            if data is not None:
+                return data
+
+            self.stats["miss"] += 1
+            data = await synthesize(text, voice, fmt)
+        if self.store is not None:
+            publish = asyncio.ensure_future(self._publish(key, data, fmt))
+            self._publishing.add(publish)
+            publish.add_done_callback(self._publishing.discard)
+
+        self._remember(key, data)
+        await asyncio.to_thread(self._write_disk, key, data)
+        return data
+
+    async def _publish(self, key: str, data: bytes, fmt: TTSFormat):
+        try:
+            await asyncio.to_thread(
+                self.store.put,
+                TTS_CACHE_STORE_PREFIX + key,
+                data,
+                fmt.media_type,
+            )
+        except Exception as e:
+            logging.warning(f"Could not publish TTS clip {key}: {e}")
+
+    async def get(
+        self,
+        text: str,
+        voice: str = TTS_VOICE_NAME,
+        fmt: TTSFormat = DEFAULT_TTS_FORMAT,
+        limiter: asyncio.Semaphore = None,
+    ) -> CachedSpeech:
+        """Return the clip for ``text``, synthesizing it on a miss.
+
+        ``limiter`` bounds concurrent fills; the clip is registered as in
+        flight before waiting on it, so lookups by key can join the wait.
+        """
+        key = tts_cache_key(text, voice, fmt)
+        speech = self._cached(key, fmt)
+        if speech is not None:
+            return speech
+
+        # Concurrent requests for the same clip share one synthesis.
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fill(key, text, voice, fmt, limiter))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        data = await asyncio.shield(task)
+        return CachedSpeech(key, fmt, data=data)
+
+    async def lookup(
+        self, key: str, fmt: TTSFormat = DEFAULT_TTS_FORMAT
+    ) -> Optional[CachedSpeech]:
+        """Return a clip by key without synthesizing it.
+
+        A clip still being synthesized in this worker is waited for.
+        """
+        if not _KEY_RE.match(key):
+            return None
+        speech = self._cached(key, fmt)
+        if speech is not None:
+            return speech
+
+        task = self._inflight.get(key)
+        if task is not None:
+            data = await asyncio.shield(task)
+        else:
+            data = await self._from_store(key)
+        if data is None:
+            return None
+        return CachedSpeech(key, fmt, data=data)
+
+    def hit_rates(self) -> dict:
+        lookups = sum(self.stats.values())
+        hits = lookups - self.stats["miss"]
+        return {
+            **self.stats,
+            "lookups": lookups,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_bytes": self._memory.currsize,
+            "disk_bytes": self._disk_usage,
+            "bytes_served": dict(self.bytes_served),
+        }
+
+    def record_served(self, fmt: TTSFormat, size: int):
+        self.bytes_served[fmt.name] += size
+
+
+@lru_cache(maxsize=None)
+def get_tts_cache() -> TTSCache:
+    store = None
+    if TTS_CACHE_STORE == "gcs":
+        store = archive_utils.GCSArchiveBackend(TTS_CACHE_BUCKET)
+    elif TTS_CACHE_STORE == "local":
+        store = archive_utils.LocalArchiveBackend(TTS_CACHE_STORE_DIR)
+    return TTSCache(store=store)
+
+
+_presynthesis_tasks = set()
+
+
+async def _presynthesize(texts: List[str], fmt: TTSFormat):
+    cache = get_tts_cache()
+    semaphore = asyncio.Semaphore(TTS_PRESYNTHESIS_CONCURRENCY)
+
+    async def synthesize_one(text: str):
+        try:
+            await cache.get(text, fmt=fmt, limiter=semaphore)
+        except Exception as e:
+            logging.warning(
+                f"Pre-synthesis failed for {tts_cache_key(text, fmt=fmt)}: {e}"
+            )
+
+    await asyncio.gather(*[synthesize_one(text) for text in texts])
+
+
+def schedule_presynthesis(texts: List[str], fmt: TTSFormat = DEFAULT_TTS_FORMAT):
+    """Warm the cache for ``texts`` in the background of this worker."""
+    texts = [text for text in dict.fromkeys(texts) if text]
+    if not texts:
+        return
+    task = asyncio.ensure_future(_presynthesize(texts, fmt))
+    _presynthesis_tasks.add(task)
+    task.add_done_callback(_presynthesis_tasks.discard)
+
+
+def tts_text_key(key: str) -> str:
+    return f"tts_text:{key}"
+
+
+async def remember_texts(redis, texts: List[str], fmt: TTSFormat = DEFAULT_TTS_FORMAT):
+    """Record the text behind each clip key for ``recall_speech``."""
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for text in dict.fromkeys(texts):
+                if text:
+                    pipe.set(
+                        tts_text_key(tts_cache_key(text, fmt=fmt)),
+                        text,
+                        ex=TTS_TEXT_TTL_SECONDS,
+                    )
+            await pipe.execute()
+    except RedisError as e:
+        logging.warning(f"Could not record TTS texts: {e}")
+
+
+async def recall_speech(
+    redis, key: str, fmt: TTSFormat = DEFAULT_TTS_FORMAT
+) -> Optional[CachedSpeech]:
+    """Synthesize a clip again from the text recorded for its key."""
+    try:
+        text = await redis.get(tts_text_key(key))
+    except RedisError as e:
+        logging.warning(f"Could not look up TTS text for {key}: {e}")
+        return None
+    # The key also covers the format, so a mismatched format is a miss.
+    if not text or tts_cache_key(text, fmt=fmt) != key:
+        return None
+    return await get_tts_cache().get(text, fmt=fmt)
+
+
+async def iter_speech(speech: CachedSpeech):
+    if speech.data is not None:
+        for start in range(0, len(speech.data), TTS_STREAM_CHUNK_BYTES):
+            yield speech.data[start : start + TTS_STREAM_CHUNK_BYTES]
+        return
+    async with aiofiles.open(speech.path, "rb") as f:
+        while chunk := await f.read(TTS_STREAM_CHUNK_BYTES):
+            yield chunk
+
+
+async def stream_speech(
+    text: str, voice: str = TTS_VOICE_NAME, fmt: TTSFormat = DEFAULT_TTS_FORMAT
+):
+    """Yield audio for ``text`` sentence by sentence.
+
+    Every sentence is requested up front but only ``TTS_STREAM_CONCURRENCY``
+    are synthesized at a time, in order, so the first sentence's audio is
+    sent as soon as it is ready while the following ones are prepared.
+    Consecutive MP3 clips concatenate into a valid stream, so the clips are
+    written out unchanged. Each sentence is cached on its own.
+    """
+    cache = get_tts_cache()
+    limiter = asyncio.Semaphore(TTS_STREAM_CONCURRENCY)
+    tasks = [
+        asyncio.ensure_future(cache.get(sentence, voice, fmt, limiter=limiter))
+        for sentence in split_sentences(text)
+    ]
+    try:
+        for task in tasks:
+            async for chunk in iter_speech(await task):
+                cache.record_served(fmt, len(chunk))
+                yield chunk
+    finally:
+        # The fills are shielded, so abandoned sentences still get cached.
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+
+import aiofiles
+from dotenv import load_dotenv
+
+import audio_utils
+
+load_dotenv()
+
+# Chunks are assembled on the local disk of the pod that receives them.
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", os.path.join("tmp_files", "uploads"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", "21600"))
+# A prefix decoder holds an ffmpeg process open; it is stopped once its
+# upload has received no chunk for this long (finalize then decodes the
+# assembled file instead).
+UPLOAD_DECODER_IDLE_SECONDS = int(os.getenv("UPLOAD_DECODER_IDLE_SECONDS", "600"))
+
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Per-worker state: serializes appends and finalize, and holds the prefix
+# decoders.
+_locks: Dict[str, asyncio.Lock] = {}
+_decoders: Dict[str, audio_utils.StreamingPcmDecoder] = {}
+_last_activity: Dict[str, float] = {}
+
+
+class UploadOffsetMismatch(Exception):
+    def __init__(self, current_offset: int):
+        super().__init__(f"Upload is at offset {current_offset}")
+        self.current_offset = current_offset
+
+
+class UploadFinalized(Exception):
+    pass
+
+
+@dataclass
+class UploadSession:
+    upload_id: str
+    user_email: str
+    interview_id: str
+    question_id: str
+    created_at: float
+    total_size: Optional[int] = None
+    content_type: Optional[str] = None
+    # Set at finalize, when the assembled file is deleted.
+    final_size: Optional[int] = None
+
+    @property
+    def data_path(self) -> str:
+        return os.path.join(UPLOAD_SPOOL_DIR, f"{self.upload_id}.part")
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(UPLOAD_SPOOL_DIR, f"{self.upload_id}.json")
+
+    @property
+    def result_path(self) -> str:
+        return os.path.join(UPLOAD_SPOOL_DIR, f"{self.upload_id}.result.json")
+
+    @property
+    def finalized(self) -> bool:
+        return os.path.exists(self.result_path)
+
+    @property
+    def offset(self) -> int:
+        if self.final_size is not None:
+            return self.final_size
+        try:
+            return os.path.getsize(self.data_path)
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def decoded_seconds(self) -> float:
+        decoder = _decoders.get(self.upload_id)
+        return decoder.decoded_seconds if decoder else 0.0
+
+
+def _drop_decoder(upload_id: str):
+    decoder = _decoders.pop(upload_id, None)
+    if decoder is not None:
+        decoder.abort()
+    _last_activity.pop(upload_id, None)
+
+
+def _sweep_idle_decoders():
+    """Stop prefix decoders of uploads that stopped sending chunks.
+
+    Abandoned uploads would otherwise keep their ffmpeg process and their
+    lock for the life of the worker.
+    """
+    now = time.time()
+    for upload_id, last_activity in list(_last_activity.items()):
+        if now - last_activity > UPLOAD_DECODER_IDLE_SECONDS:
+            _drop_decoder(upload_id)
+    for upload_id, lock in list(_locks.items()):
+        if upload_id not in _last_activity and not lock.locked():
+            _locks.pop(upload_id, None)
+
+
+def _sweep_expired_sessions():
+    _sweep_idle_decoders()
+    cutoff = time.time() - UPLOAD_SESSION_TTL_SECONDS
+    for filename in os.listdir(UPLOAD_SPOOL_DIR):
+        path = os.path.join(UPLOAD_SPOOL_DIR, filename)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def create_session(
+    user_email: str,
+    interview_id: str,
+    question_id: str,
+    total_size: Optional[int] = None,
+    content_type: Optional[str] = None,
+) -> UploadSession:
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    _sweep_expired_sessions()
+
+    session = UploadSession(
+        upload_id=uuid.uuid4().hex,
+        user_email=user_email,
+        interview_id=interview_id,
+        question_id=question_id,
+        created_at=time.time(),
+        total_size=total_size,
+        content_type=content_type,
+    )
+    _write_meta(session)
+    open(session.data_path, "wb").close()
+    return session
+
+
+def _write_meta(session: UploadSession):
+    tmp_path = f"{session.meta_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(asdict(session), f)
+    os.replace(tmp_path, session.meta_path)
+
+
+def load_session(upload_id: str) -> Optional[UploadSession]:
+    if not _UPLOAD_ID_RE.match(upload_id or ""):
+        return None
+    try:
+        with open(os.path.join(UPLOAD_SPOOL_DIR, f"{upload_id}.json")) as f:
+            return UploadSession(**json.load(f))
+    except FileNotFoundError:
+        return None
+
+
+@asynccontextmanager
+async def upload_lock(session: UploadSession):
+    """Hold this worker's lock for the upload, as ``append_chunk`` does."""
+    lock = _locks.setdefault(session.upload_id, asyncio.Lock())
+    async with lock:
+        yield
+
+
+async def append_chunk(session: UploadSession, offset: int, data: bytes) -> int:
+    """Append ``data`` at ``offset`` and return the new offset.
+
+    The chunk is also fed to a streaming decoder, started with the first
+    chunk, so duration probing and silence detection can work on the prefix
+    while the rest of the answer is still uploading. If chunks for this
+    upload arrive at a different worker, that decoder is dropped and the
+    assembled file is decoded at finalize instead.
+    """
+    _sweep_idle_decoders()
+    async with upload_lock(session):
+        if session.finalized:
+            raise UploadFinalized()
+        _last_activity[session.upload_id] = time.time()
+        current = session.offset
+        if offset != current:
+            raise UploadOffsetMismatch(current)
+
+        async with aiofiles.open(session.data_path, "ab") as f:
+            await f.write(data)
+
+        decoder = _decoders.get(session.upload_id)
+        if offset == 0 and decoder is None:
+            decoder = audio_utils.StreamingPcmDecoder()
+            await decoder.start()
+            _decoders[session.upload_id] = decoder
+        if decoder is not None:
+            if decoder.bytes_fed == offset:
+                await decoder.feed(data)
+            else:
+                _drop_decoder(session.upload_id)
+
+        return offset + len(data)
+
+
+async def assemble(session: UploadSession):
+    """Return the uploaded bytes and, when available, their decoded PCM.
+
+    Call under ``upload_lock`` so no chunk lands while the file is read.
+    """
+    samples = None
+    decoder = _decoders.pop(session.upload_id, None)
+    _last_activity.pop(session.upload_id, None)
+    async with aiofiles.open(session.data_path, "rb") as f:
+        audio_bytes = await f.read()
+
+    if decoder is not None:
+        if decoder.bytes_fed == len(audio_bytes):
+            samples = await decoder.finish()
+        else:
+            decoder.abort()
+    if samples is None:
+        logging.info(f"Upload {session.upload_id}: no usable prefix decode")
+    return audio_bytes, samples
+
+
+def load_result(session: UploadSession) -> Optional[dict]:
+    """The stored finalize result, if this upload was already finalized."""
+    try:
+        with open(session.result_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def complete(session: UploadSession, result: dict):
+    """Record the finalize result and free the upload's audio and decoder.
+
+    The session, with its final size, and the result are kept until the
+    session expires, so a client that lost the finalize response can check
+    the upload or retry the finalize and get the same result.
+    """
+    session.final_size = session.offset
+    _write_meta(session)
+    tmp_path = f"{session.result_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, session.result_path)
+    _drop_decoder(session.upload_id)
+    try:
+        os.remove(session.data_path)
+    except FileNotFoundError:
+        pass